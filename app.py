@@ -9,7 +9,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # 2) Import your RAG pipeline
-from app.core.rag_pipeline import run_rag
+from app.core.rag_pipeline import run_rag, get_tenant
+from app.core.tenants import TenantNotFound
 
 # 3) Import booking service (ensure booking.py has load_dotenv() already)
 from services.booking import create_booking, cancel_booking, booking_exists
@@ -29,11 +30,20 @@ def chat():
     msg = data.get("message")
     if not msg:
         return jsonify(error="Missing 'message' in JSON"), 422
+    tenant_id = request.headers.get("X-Tenant-ID")
     try:
-        answer, sources = run_rag(msg)
-        return jsonify(answer=answer, sources=sources)
+        tenant = get_tenant(tenant_id, acquire=True)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except TenantNotFound:
+        return jsonify(error=f"Unknown tenant: {tenant_id}"), 404
+    try:
+        answer, sources, mode = run_rag(msg, tenant)
+        return jsonify(answer=answer, sources=sources, mode=mode)
     except Exception as e:
         return jsonify(error=str(e)), 500
+    finally:
+        tenant.release()
 
 # ─── Create Booking endpoint (accepts both /booking/create and /booking/create/) ──
 @app.route("/booking/create", methods=["POST"], strict_slashes=False)
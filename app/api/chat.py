@@ -1,28 +1,63 @@
 # app/api/chat.py
 
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
-from app.core.rag_pipeline import run_rag
+from app.core.rag_pipeline import (
+    SESSIONS,
+    get_tenant,
+    remember_turn,
+    run_rag_async,
+    stream_rag_async,
+)
+from app.core.tenants import TenantContext, TenantNotFound
+from app.core.metrics import BOOKING_INTENTS, CHAT_ERRORS, REQUEST_LATENCY
 from services.booking import create_booking, cancel_booking, booking_exists
 
 router = APIRouter()
 
 
 class ChatRequest(BaseModel):
-    message: str  # The user's input message
+    message: str                      # The user's input message
+    session_id: Optional[str] = None  # From a previous response; omit to start a session
 
 
 class ChatResponse(BaseModel):
     answer: str              # The LLM's answer (or booking confirmation)
     sources: List[str] = []  # Identifiers of source chunks used (empty for booking)
+    session_id: Optional[str] = None  # Send back to continue the conversation
+    mode: Optional[str] = None        # direct | cache | extractive | llm | booking
 
 
-@router.post("/", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def resolve_tenant(request: Request):
     """
-    Handle POST /chat requests:
+    Tenant of the request: the `{tenant_id}` path segment when mounted
+    under /tenants/{tenant_id}/chat, else the X-Tenant-ID header, else
+    the default company. The tenant is leased until the response (or
+    the whole SSE stream) has been sent, so LRU eviction never closes
+    it under a running request.
+    """
+    tenant_id = request.path_params.get("tenant_id") or request.headers.get("X-Tenant-ID")
+    try:
+        tenant = await run_in_threadpool(get_tenant, tenant_id, True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TenantNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant_id}")
+    try:
+        yield tenant
+    finally:
+        tenant.release()
+
+
+async def handle_booking_intent(original: str) -> Optional[ChatResponse]:
+    """
+    Handle the booking commands shared by /chat and /chat/stream:
 
       1) If user starts with "create booking", parse:
            name=<...>, phone=<...>, trip_name=<...>,
@@ -33,9 +68,8 @@ async def chat(req: ChatRequest):
       2) If user starts with "cancel booking <booking_id>",
          attempt to delete that booking in MongoDB.
 
-      3) Otherwise, run the RAG pipeline via run_rag().
+    Returns None when the message is not a booking command.
     """
-    original = req.message.strip()
     lower = original.lower()
 
     # ─── 1) CREATE BOOKING INTENT ────────────────────────────────────────────
@@ -69,7 +103,8 @@ async def chat(req: ChatRequest):
             email            = parsed.get("email")
             special_requests = parsed.get("special_requests")
 
-            booking_id = create_booking(
+            booking_id = await run_in_threadpool(
+                create_booking,
                 name=name,
                 phone=phone,
                 trip_name=trip_name,
@@ -78,12 +113,14 @@ async def chat(req: ChatRequest):
                 email=email,
                 special_requests=special_requests,
             )
+            BOOKING_INTENTS.labels("create", "created").inc()
             return ChatResponse(
                 answer=f"✅ Your booking is confirmed! Booking ID: {booking_id}",
                 sources=[]
             )
 
         except KeyError:
+            BOOKING_INTENTS.labels("create", "missing_fields").inc()
             return ChatResponse(
                 answer=(
                     "❌ To create a booking, please include at least:\n"
@@ -93,6 +130,7 @@ async def chat(req: ChatRequest):
                 sources=[]
             )
         except Exception:
+            BOOKING_INTENTS.labels("create", "error").inc()
             return ChatResponse(
                 answer=(
                     "❌ Booking wasn’t created. Please ensure all fields use exactly `key=value` separated by commas.\n"
@@ -107,25 +145,121 @@ async def chat(req: ChatRequest):
         tokens = original.split()
         if len(tokens) == 3:
             bid = tokens[-1].strip()
-            if cancel_booking(bid):
+            if await run_in_threadpool(cancel_booking, bid):
+                BOOKING_INTENTS.labels("cancel", "cancelled").inc()
                 return ChatResponse(
                     answer=f"✅ Booking {bid} has been cancelled.",
                     sources=[]
                 )
             else:
+                BOOKING_INTENTS.labels("cancel", "not_found").inc()
                 return ChatResponse(
                     answer=f"❌ No booking found with ID {bid}.",
                     sources=[]
                 )
         else:
+            BOOKING_INTENTS.labels("cancel", "invalid").inc()
             return ChatResponse(
                 answer="❌ To cancel a booking, use exactly: `cancel booking <booking_id>`",
                 sources=[]
             )
 
-    # ─── 3) FALL BACK TO RAG PIPELINE ──────────────────────────────────────
-    try:
-        answer, sources = run_rag(original)
-        return ChatResponse(answer=answer, sources=sources)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return None
+
+
+@router.post("/", response_model=ChatResponse)
+async def chat(req: ChatRequest, tenant: TenantContext = Depends(resolve_tenant)):
+    """
+    Handle POST /chat requests:
+
+      1) Booking commands ("create booking …", "cancel booking …"),
+         see handle_booking_intent().
+
+      2) Otherwise, run the RAG pipeline via run_rag_async().
+
+    Blocking work (MongoDB, Chroma) runs off the event loop so one slow
+    request does not stall the others on this worker.
+
+    The session's summary, last turns and pages are passed to the RAG
+    pipeline so follow-up questions keep their context.
+    """
+    original = req.message.strip()
+    session_id, conversation = _session(req, tenant)
+
+    with REQUEST_LATENCY.labels("chat").time():
+        booking = await handle_booking_intent(original)
+        if booking is not None:
+            booking.session_id = session_id
+            booking.mode = "booking"
+            return booking
+
+        # ─── FALL BACK TO RAG PIPELINE ─────────────────────────────────────
+        try:
+            answer, sources, mode = await run_rag_async(original, tenant, conversation=conversation)
+            await run_in_threadpool(remember_turn, tenant, session_id, original, answer, sources)
+            return ChatResponse(answer=answer, sources=sources, session_id=session_id, mode=mode)
+        except Exception as e:
+            CHAT_ERRORS.labels("chat").inc()
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+def _session(req: ChatRequest, tenant: TenantContext):
+    """
+    (session_id, conversation snapshot or None); unknown, expired or
+    malformed ids start a new session.
+    """
+    if SESSIONS.valid_id(req.session_id):
+        conversation = SESSIONS.get(tenant.tenant_id, req.session_id)
+        if conversation is not None:
+            return req.session_id, conversation
+    return SESSIONS.new_id(), None
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest, tenant: TenantContext = Depends(resolve_tenant)):
+    """
+    Server-Sent Events version of POST /chat.
+
+    Emits `session` ({"session_id": ...}), `mode` (which of direct, cache,
+    extractive, llm or booking answers) and `sources` (list of page ids)
+    first, then one `token` event per answer delta, then `done`. Booking
+    commands answer in a single token. Failures after the stream has
+    started are sent as an `error` event.
+    """
+    original = req.message.strip()
+    session_id, conversation = _session(req, tenant)
+
+    async def events():
+        with REQUEST_LATENCY.labels("stream").time():
+            try:
+                yield _sse("session", {"session_id": session_id})
+                booking = await handle_booking_intent(original)
+                if booking is not None:
+                    yield _sse("mode", "booking")
+                    yield _sse("sources", booking.sources)
+                    yield _sse("token", booking.answer)
+                else:
+                    sources, parts = [], []
+                    async for kind, payload in stream_rag_async(original, tenant, conversation=conversation):
+                        if kind == "sources":
+                            sources = payload
+                        elif kind == "token":
+                            parts.append(payload)
+                        yield _sse(kind, payload)
+                    await run_in_threadpool(
+                        remember_turn, tenant, session_id, original, "".join(parts).strip(), sources
+                    )
+            except Exception as e:
+                CHAT_ERRORS.labels("stream").inc()
+                yield _sse("error", str(e))
+            yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
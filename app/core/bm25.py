@@ -0,0 +1,117 @@
+# app/core/bm25.py
+
+import math
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+our the this to tour trip us we what when where which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Hit(NamedTuple):
+    id: str
+    document: str
+    metadata: dict
+    score: float
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks Transformer writes into each structured JSON.
+
+    Per-term contributions are precomputed at build time, so a query is one
+    numpy scatter-add per query term.
+    """
+
+    def __init__(self, chunks: list[dict], k1: float = 1.5, b: float = 0.75):
+        self.ids       = [c["id"] for c in chunks]
+        self.documents = [c["text"] for c in chunks]
+        self.metadatas = [c.get("metadata", {}) for c in chunks]
+
+        docs_tokens = [tokenize(t) for t in self.documents]
+        n      = len(docs_tokens)
+        lens   = np.array([len(t) for t in docs_tokens], dtype=np.float32)
+        avgdl  = float(lens.mean()) if n else 0.0
+
+        tfs: dict[str, dict[int, int]] = {}
+        for i, toks in enumerate(docs_tokens):
+            for tok in toks:
+                row = tfs.setdefault(tok, {})
+                row[i] = row.get(i, 0) + 1
+
+        # term → (doc indices, BM25 weight of the term in each doc)
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, row in tfs.items():
+            idx = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            tf  = np.fromiter(row.values(), dtype=np.float32, count=len(row))
+            idf = math.log(1 + (n - len(row) + 0.5) / (len(row) + 0.5))
+            norm = k1 * (1 - b + b * lens[idx] / avgdl) if avgdl else k1
+            self._postings[term] = (idx, idf * tf * (k1 + 1) / (tf + norm))
+        self._n = n
+
+    @classmethod
+    def from_pages(cls, pages: dict) -> "BM25Index":
+        chunks = []
+        for page in pages.values():
+            chunks.extend(page.get("chunks", []))
+        return cls(chunks)
+
+    def search(self, query: str, top_k: int = 3) -> list[Hit]:
+        if not self._n:
+            return []
+        scores = np.zeros(self._n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1])
+        k = min(top_k, self._n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self._n else np.arange(self._n)
+        top = top[np.argsort(-scores[top])]
+        return [
+            Hit(self.ids[i], self.documents[i], self.metadatas[i], float(scores[i]))
+            for i in top if scores[i] > 0
+        ]
+
+    @staticmethod
+    def is_confident(hits: list[Hit], min_score: float, margin: float) -> bool:
+        """
+        True when the best hit clears `min_score` and beats the best hit
+        from any other page by a relative `margin`.
+        """
+        if not hits or hits[0].score < min_score:
+            return False
+        best_page = hits[0].metadata.get("page_id")
+        runner_up = next(
+            (h.score for h in hits[1:] if h.metadata.get("page_id") != best_page), 0.0
+        )
+        return hits[0].score >= runner_up * (1 + margin)
+
+    def __len__(self):
+        return self._n
+
+
+def reciprocal_rank_fusion(rankings: list[list[Hit]], top_k: int, k: int = 60) -> list[Hit]:
+    """
+    Merge several best-first rankings by summing 1 / (k + rank). A hit
+    keeps the document of its first ranking, with metadata keys the
+    others add (e.g. section / chunk_index from the page index).
+    """
+    fused, first_seen = {}, {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            fused[hit.id] = fused.get(hit.id, 0.0) + 1.0 / (k + rank + 1)
+            seen = first_seen.setdefault(hit.id, hit)
+            if seen is not hit and hit.metadata:
+                first_seen[hit.id] = seen._replace(metadata={**hit.metadata, **(seen.metadata or {})})
+    order = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [first_seen[i]._replace(score=fused[i]) for i in order]
@@ -0,0 +1,214 @@
+# app/core/cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    Keeps hit/miss counters so the cache can be sized from real traffic.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        if maxsize < 0:
+            raise ValueError("maxsize must be non-negative")
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._data: OrderedDict = OrderedDict()   # key → (expires_at, value)
+        self._lock   = threading.Lock()
+        self.hits    = 0
+        self.misses  = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        Return size and hit/miss counters for monitoring.
+        """
+        total = self.hits + self.misses
+        return {
+            "size":     len(self._data),
+            "maxsize":  self.maxsize,
+            "ttl":      self.ttl,
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+class SemanticCache:
+    """
+    Answer cache keyed on query-embedding similarity.
+
+    Stores (embedding, answer, sources) and returns the stored answer when a
+    new query's cosine similarity with a cached one reaches `threshold`.
+    Embeddings live in one preallocated matrix so a lookup is a single
+    matrix-vector product; the least recently used slot is evicted when full.
+    """
+
+    def __init__(self, maxsize: int = 512, threshold: float = 0.95, ttl: float = 86400.0):
+        if maxsize < 0:
+            raise ValueError("maxsize must be non-negative")
+        self.maxsize   = maxsize
+        self.threshold = threshold
+        self.ttl       = ttl
+        self._vecs     = None                       # (maxsize, dim) float32, allocated lazily
+        self._entries  = [None] * maxsize           # slot → (expires_at, answer, sources)
+        self._used     = np.zeros(maxsize, dtype=np.int64)   # LRU clock per slot
+        self._clock    = 0
+        self._count    = 0
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+
+    @staticmethod
+    def _unit(emb) -> np.ndarray:
+        v = np.asarray(emb, dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def lookup(self, emb):
+        """
+        Return (answer, sources) of the most similar cached query, or None.
+        """
+        if self.maxsize == 0:
+            return None
+        q = self._unit(emb)
+        now = time.monotonic()
+        with self._lock:
+            if self._count == 0 or self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            sims = self._vecs[:self._count] @ q
+            i = int(np.argmax(sims))
+            entry = self._entries[i]
+            if sims[i] < self.threshold or entry is None or entry[0] < now:
+                self.misses += 1
+                return None
+            self._clock += 1
+            self._used[i] = self._clock
+            self.hits += 1
+            return entry[1], list(entry[2])
+
+    def store(self, emb, answer: str, sources: list[str]):
+        if self.maxsize == 0:
+            return
+        q = self._unit(emb)
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                self._vecs  = np.zeros((self.maxsize, q.shape[0]), dtype=np.float32)
+                self._count = 0
+            if self._count < self.maxsize:
+                i = self._count
+                self._count += 1
+            else:
+                i = int(np.argmin(self._used))
+            self._vecs[i] = q
+            self._entries[i] = (time.monotonic() + self.ttl, answer, list(sources))
+            self._clock += 1
+            self._used[i] = self._clock
+
+    def clear(self):
+        with self._lock:
+            self._count   = 0
+            self._entries = [None] * self.maxsize
+            self._used[:] = 0
+
+    def __len__(self):
+        return self._count
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size":      self._count,
+            "maxsize":   self.maxsize,
+            "threshold": self.threshold,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "hit_rate":  (self.hits / total) if total else 0.0,
+        }
+
+
+class PathWatcher:
+    """
+    Detects changes under a file or directory (added/removed files or new
+    mtimes/sizes). The tree is walked at most every `check_interval` seconds.
+    """
+
+    def __init__(self, path, check_interval: float = 5.0):
+        self.path           = Path(path)
+        self.check_interval = check_interval
+        self._checked_at    = time.monotonic()
+        self._lock          = threading.Lock()
+        self._fingerprint   = self._scan()
+
+    def _scan(self) -> frozenset:
+        entries = []
+        if self.path.is_file():
+            st = self.path.stat()
+            return frozenset([(str(self.path), st.st_mtime_ns, st.st_size)])
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((os.path.join(root, name), st.st_mtime_ns, st.st_size))
+        return frozenset(entries)
+
+    def changed(self) -> bool:
+        """
+        True once after each detected change.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            fingerprint = self._scan()
+            if fingerprint == self._fingerprint:
+                return False
+            self._fingerprint = fingerprint
+            return True
+
+    def invalidate(self):
+        """
+        Report a change at the next check (e.g. after a failed reload).
+        """
+        with self._lock:
+            self._fingerprint = None
@@ -0,0 +1,203 @@
+# app/core/completion_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+COMPLETION_CACHE        = os.getenv("COMPLETION_CACHE", "1") not in ("0", "false", "no")
+COMPLETION_CACHE_PATH   = os.getenv("COMPLETION_CACHE_PATH", ".cache/completions.sqlite3")
+COMPLETION_CACHE_MAX_MB = float(os.getenv("COMPLETION_CACHE_MAX_MB", "256"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key       TEXT PRIMARY KEY,
+    model     TEXT NOT NULL,
+    response  TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used);
+"""
+
+
+class CompletionCache:
+    """
+    Exact-match cache of deterministic (temperature 0) chat completions
+    in SQLite, keyed on a hash of model, messages and sampling parameters.
+
+    The database runs in WAL mode so the API workers and the ingestion
+    pipeline can share one file: readers never block and writers queue
+    behind `busy_timeout`. Once the stored responses exceed `max_bytes`
+    the least recently used ones are deleted down to 90% of it. Any
+    SQLite error is logged and treated as a miss.
+
+    A hit is a plain read: its last_used time is remembered in memory and
+    written back in one batch every `touch_batch` hits or `touch_interval`
+    seconds (best effort, skipped if the database is busy), so concurrent
+    readers don't queue behind each other's write transactions.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 256 * 1024 * 1024,
+                 touch_batch: int = 64, touch_interval: float = 30.0):
+        self.path      = Path(path)
+        self.max_bytes = max_bytes
+        self.touch_batch    = touch_batch
+        self.touch_interval = touch_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local    = threading.local()   # one connection per thread
+        self._lock     = threading.Lock()
+        self._touched: dict[str, float] = {}   # key → last hit, not yet written
+        self._touched_at = time.monotonic()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(model: str, messages: list[dict], params: dict) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        try:
+            row = self._conn().execute("SELECT response FROM completions WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Completion cache read failed: {e}")
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            flush = (len(self._touched) >= self.touch_batch
+                     or time.monotonic() - self._touched_at >= self.touch_interval)
+        if flush:
+            self._flush_touched()
+        return row[0]
+
+    def _flush_touched(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.monotonic()
+        if not touched:
+            return
+        try:
+            conn = self._conn()
+            conn.execute("PRAGMA busy_timeout = 0")
+            try:
+                with conn:
+                    conn.executemany(
+                        "UPDATE completions SET last_used = MAX(last_used, ?) WHERE key = ?",
+                        [(t, k) for k, t in touched.items()],
+                    )
+            finally:
+                conn.execute("PRAGMA busy_timeout = 5000")
+        except sqlite3.Error as e:
+            logger.debug(f"Completion cache last_used update skipped: {e}")
+
+    def put(self, key: str, model: str, response: str):
+        size = len(response.encode("utf-8"))
+        now  = time.time()
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, size, now, now),
+                )
+            with self._lock:
+                self._bytes += size
+                over = self._bytes > self.max_bytes
+            if over:
+                self._evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Completion cache write failed: {e}")
+
+    def _evict(self):
+        self._flush_touched()
+        # other processes write to the same file, so recount before deleting
+        with self._conn() as conn:
+            total  = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            target = int(self.max_bytes * 0.9)
+            freed, n = 0, 0
+            if total > self.max_bytes:
+                for key, size in conn.execute(
+                    "SELECT key, size FROM completions ORDER BY last_used"
+                ).fetchall():
+                    if total - freed <= target:
+                        break
+                    conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    freed += size
+                    n     += 1
+        with self._lock:
+            self._bytes     = total - freed
+            self.evictions += n
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM completions")
+        with self._lock:
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "bytes":     self._bytes,
+                "evictions": self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> CompletionCache | None:
+    """
+    The shared cache at COMPLETION_CACHE_PATH, or None when disabled
+    (COMPLETION_CACHE=0) or the file cannot be opened.
+    """
+    global _cache, COMPLETION_CACHE
+    if not COMPLETION_CACHE:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and COMPLETION_CACHE:
+                try:
+                    _cache = CompletionCache(
+                        COMPLETION_CACHE_PATH, int(COMPLETION_CACHE_MAX_MB * 1024 * 1024)
+                    )
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"Completion cache disabled ({COMPLETION_CACHE_PATH}): {e}")
+                    COMPLETION_CACHE = False
+    return _cache
+
+
+def completion_cache_stats() -> dict:
+    return _cache.stats() if _cache is not None else {}
@@ -0,0 +1,134 @@
+# app/core/context_packer.py
+
+import re
+
+from app.core.bm25 import Hit
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:   # not installed, or the encoding can't be fetched offline
+    _ENCODING = None
+
+_WORD = re.compile(r"\w+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Prompt tokens in `text`: exact with tiktoken, otherwise the usual
+    ~4 characters per token estimate.
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _merge_words(a: list[str], b: list[str]) -> list[str]:
+    """
+    Append `b` to `a`, dropping the longest prefix of `b` that `a` already
+    ends with (Transformer windows overlap by a fixed number of words).
+    """
+    for k in range(min(len(a), len(b)), 0, -1):
+        if a[-k:] == b[:k]:
+            return a + b[k:]
+    return a + b
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def merge_windows(hits: list[Hit]) -> list[Hit]:
+    """
+    Stitch consecutive chunks of the same page section into one block.
+
+    Blocks keep the relevance order of their best-ranked chunk; the id and
+    metadata are those of the block's first chunk.
+    """
+    groups: dict[tuple, list[tuple[int, Hit]]] = {}
+    for rank, hit in enumerate(hits):
+        meta = hit.metadata or {}
+        key  = (meta.get("page_id"), meta.get("section"))
+        if key == (None, None):
+            key = ("", hit.id)   # no grouping info – keep it as is
+        groups.setdefault(key, []).append((rank, hit))
+
+    blocks: list[tuple[int, Hit]] = []
+    for members in groups.values():
+        members.sort(key=lambda m: (m[1].metadata or {}).get("chunk_index", 0))
+        run_rank, run_hit = members[0]
+        run_words = run_hit.document.split()
+        prev_idx  = (run_hit.metadata or {}).get("chunk_index")
+        for rank, hit in members[1:]:
+            idx = (hit.metadata or {}).get("chunk_index")
+            if prev_idx is not None and idx == prev_idx + 1:
+                run_words = _merge_words(run_words, hit.document.split())
+                run_rank  = min(run_rank, rank)
+                run_hit   = run_hit._replace(score=max(run_hit.score, hit.score))
+            else:
+                blocks.append((run_rank, run_hit._replace(document=" ".join(run_words))))
+                run_rank, run_hit, run_words = rank, hit, hit.document.split()
+            prev_idx = idx
+        blocks.append((run_rank, run_hit._replace(document=" ".join(run_words))))
+
+    blocks.sort(key=lambda b: b[0])
+    return [hit for _, hit in blocks]
+
+
+def _truncate(text: str, budget: int) -> str:
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:   # longest word prefix that fits
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def pack_context(
+    hits: list[Hit],
+    max_tokens: int,
+    dedupe_threshold: float = 0.8,
+    separator: str = "\n---\n",
+) -> list[Hit]:
+    """
+    Turn best-first retrieval hits into the blocks that go into the prompt.
+
+    1) overlapping windows of the same page/section are merged,
+    2) blocks whose 3-gram Jaccard similarity to an already kept block is
+       at least `dedupe_threshold` are dropped,
+    3) blocks are added by relevance while they fit in `max_tokens`
+       (separators included); a block that doesn't fit is skipped so a
+       smaller, less relevant one can still use the space. If not even the
+       best block fits, it is truncated to the budget.
+    """
+    kept, kept_shingles, used = [], [], 0
+    sep_tokens = count_tokens(separator)
+    for block in merge_windows(hits):
+        shingles = _shingles(block.document)
+        if any(_jaccard(shingles, s) >= dedupe_threshold for s in kept_shingles):
+            continue
+        cost = count_tokens(block.document) + (sep_tokens if kept else 0)
+        if used + cost > max_tokens:
+            continue
+        kept.append(block)
+        kept_shingles.append(shingles)
+        used += cost
+
+    if not kept and hits and max_tokens > 0:
+        best = merge_windows(hits)[0]
+        text = _truncate(best.document, max_tokens)
+        if text:
+            kept.append(best._replace(document=text))
+    return kept
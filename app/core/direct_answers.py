@@ -0,0 +1,104 @@
+# app/core/direct_answers.py
+
+import json
+import re
+from pathlib import Path
+
+# Lookup table written at ingest time next to the structured JSON
+TABLE_FILE = "direct_answers.json"
+
+# map trigger → json key, in priority order
+SECTION_MAP = {
+    "include":    "what_is_included",
+    "exclude":    "what_is_excluded",
+    "itinerar":   "itinerary",
+    "highlight":  "tour_highlights",
+    "overview":   "overview",
+    "faq":        "trip_faqs",
+}
+_PRIORITY = {sec_key: i for i, sec_key in enumerate(SECTION_MAP.values())}
+
+# One alternation for the whole intent: an "N-day" mention or a section
+# trigger. A single finditer over the lowered query resolves both.
+_INTENT = re.compile(
+    r"(?P<days>\d+)[-\s]*day|"
+    + "|".join(f"(?P<{sec_key}>{re.escape(token)})" for token, sec_key in SECTION_MAP.items())
+)
+
+
+def match_intent(query: str) -> tuple[int | None, str | None]:
+    """
+    Return (day_count, section_key) mentioned in the query; either may be
+    None. When several sections are mentioned the SECTION_MAP order wins.
+    """
+    days, section = None, None
+    for m in _INTENT.finditer(query.lower()):
+        kind = m.lastgroup
+        if kind == "days":
+            if days is None:
+                days = int(m.group("days"))
+        elif section is None or _PRIORITY[kind] < _PRIORITY[section]:
+            section = kind
+    return days, section
+
+
+def render_section(title: str, sec_key: str, sec) -> str | None:
+    """
+    Canonical direct answer for one section of a page, or None if the
+    section is missing.
+    """
+    if sec_key in ("what_is_included", "what_is_excluded") and isinstance(sec, list) and sec:
+        items = sec
+        body  = (
+            items[0] if len(items)==1
+            else ", ".join(items[:-1]) + " and " + items[-1]
+        )
+        verb = "includes" if sec_key=="what_is_included" else "excludes"
+        return (
+            f"For the “{title}” package, the tour {verb} "
+            f"{body}."
+        )
+
+    if sec_key == "itinerary" and isinstance(sec, dict):
+        lines = []
+        for day, plan in sec.items():
+            detail = "; ".join(plan) if isinstance(plan, list) else str(plan)
+            lines.append(f"{day}: {detail}")
+        return f"Here’s the itinerary for “{title}”: " + " | ".join(lines)
+
+    if sec_key == "tour_highlights" and isinstance(sec, list) and sec:
+        top3 = sec[:3]
+        return (
+            f"Key highlights of “{title}” include "
+            f"{', '.join(top3[:-1])} and {top3[-1]}."
+        )
+
+    # fallback simple sections
+    if sec is not None:
+        if isinstance(sec, list):
+            return "; ".join(str(x) for x in sec)
+        return str(sec)
+
+    return None
+
+
+def render_page(title: str, sections: dict) -> dict:
+    """
+    section_key → rendered answer for every answerable section of a page.
+    """
+    answers = {}
+    for sec_key in SECTION_MAP.values():
+        answer = render_section(title, sec_key, sections.get(sec_key))
+        if answer is not None:
+            answers[sec_key] = answer
+    return answers
+
+
+def load_table(path: Path) -> dict:
+    """
+    page_id → {section_key: answer}; empty if the table is missing or unreadable.
+    """
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
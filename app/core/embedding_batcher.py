@@ -0,0 +1,121 @@
+# app/core/embedding_batcher.py
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve(setter, value):
+    # one caller's future in a bad state must not strand the rest of the batch
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent single-text embedding requests.
+
+    Callers get a Future per text. A collector thread waits up to
+    `window_ms` after the first pending request (or until `max_batch`
+    texts are queued), then sends the whole batch through `embed_batch`
+    as one API call and fans the vectors back out. Up to `max_inflight`
+    batches may be in flight at once. Cancelled futures are dropped from
+    their batch without affecting the other callers in it.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], list[list[float]]],
+        window_ms: float = 5.0,
+        max_batch: int = 64,
+        max_inflight: int = 4,
+        timeout: float = 30.0,
+    ):
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive")
+        self.embed_batch = embed_batch
+        self.window      = window_ms / 1000.0
+        self.max_batch   = max_batch
+        self.timeout     = timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._pool   = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="embed-batch")
+        self._thread = None
+        self._lock   = threading.Lock()
+        self.batches = 0   # API calls made
+        self.texts   = 0   # texts embedded
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._collect, name="embed-batcher", daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._ensure_started()
+        self._queue.put((text, fut))
+        return fut
+
+    def embed(self, text: str) -> list[float]:
+        fut = self.submit(text)
+        try:
+            return fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            fut.cancel()
+            raise TimeoutError(f"Embedding not ready after {self.timeout}s") from None
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._flush, batch)
+
+    def _flush(self, batch: list):
+        # callers that gave up before the batch ran are dropped; the rest
+        # can no longer be cancelled
+        batch = [(text, fut) for text, fut in batch if fut.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # identical texts in one window share a single input slot
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = self.embed_batch(unique)
+            if len(vectors) != len(unique):
+                raise RuntimeError(f"Expected {len(unique)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            logger.warning(f"Embedding batch of {len(unique)} failed: {e}")
+            for _, fut in batch:
+                _resolve(fut.set_exception, e)
+            return
+        self.batches += 1
+        self.texts   += len(unique)
+        by_text = dict(zip(unique, vectors))
+        for text, fut in batch:
+            _resolve(fut.set_result, by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "batches":    self.batches,
+            "texts":      self.texts,
+            "avg_batch":  (self.texts / self.batches) if self.batches else 0.0,
+            "pending":    self._queue.qsize(),
+        }
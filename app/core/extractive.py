@@ -0,0 +1,97 @@
+# app/core/extractive.py
+
+import re
+from typing import NamedTuple
+
+from app.core.bm25 import Hit, tokenize
+
+# Transformer writes FAQ chunks as "Q: <question> A: <answer>" (one pair
+# per chunk, sometimes several separated by newlines)
+_FAQ      = re.compile(r"Q:\s*(?P<q>.+?)\s*A:\s*(?P<a>.+?)(?=\s*Q:|\Z)", re.S)
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+# FAQ answers the structurer could not fill in
+_NO_ANSWER = re.compile(r"\bnot (available|provided|mentioned)\b", re.I)
+
+FAQ_WEIGHT      = 1.0    # an FAQ answer is written to be served as is
+SENTENCE_WEIGHT = 0.8    # a body sentence may need context the LLM would add
+RANK_DECAY      = 0.9    # per retrieval rank below the top hit
+MIN_SENTENCE_WORDS = 4
+MIN_MATCHED_TERMS  = 2   # one shared word says what a span is about, not that it answers
+
+
+class Span(NamedTuple):
+    text: str
+    score: float     # 0..1
+    hit_id: str
+    page_id: str
+    kind: str        # "faq" | "sentence"
+
+
+def _overlap(query: set, unit: set) -> float:
+    """
+    Mostly recall of the query's content words, tempered by how much of
+    the unit is about something else; 0 unless at least MIN_MATCHED_TERMS
+    words are shared.
+    """
+    common = len(query & unit)
+    if common < MIN_MATCHED_TERMS:
+        return 0.0
+    return 0.75 * common / len(query) + 0.25 * common / len(unit)
+
+
+def _same_answer(a: str, b: str, threshold: float = 0.5) -> bool:
+    """
+    Paraphrases of one answer (pages repeat the same FAQ with small edits).
+    """
+    ta, tb = set(tokenize(a)), set(tokenize(b))
+    if not ta or not tb:
+        return a == b
+    return len(ta & tb) / len(ta | tb) >= threshold
+
+
+def candidate_spans(query: str, hits: list[Hit]) -> list[Span]:
+    """
+    Every FAQ answer and body sentence in `hits`, scored against `query`,
+    best first. FAQ answers are scored by how well their question matches.
+    """
+    q_tokens = set(tokenize(query))
+    spans: list[Span] = []
+    for rank, hit in enumerate(hits):
+        decay   = RANK_DECAY ** rank
+        page_id = (hit.metadata or {}).get("page_id", "unknown")
+        faqs    = list(_FAQ.finditer(hit.document))
+        if faqs:
+            for m in faqs:
+                answer = " ".join(m.group("a").split())
+                if not answer or _NO_ANSWER.search(answer):
+                    continue
+                score = _overlap(q_tokens, set(tokenize(m.group("q")))) * FAQ_WEIGHT * decay
+                spans.append(Span(answer, score, hit.id, page_id, "faq"))
+            continue
+        for sentence in _SENTENCE.split(hit.document):
+            sentence = " ".join(sentence.split())
+            if len(sentence.split()) < MIN_SENTENCE_WORDS:
+                continue
+            score = _overlap(q_tokens, set(tokenize(sentence))) * SENTENCE_WEIGHT * decay
+            spans.append(Span(sentence, score, hit.id, page_id, "sentence"))
+    spans.sort(key=lambda s: s.score, reverse=True)
+    return spans
+
+
+def extract_answer(query: str, hits: list[Hit], threshold: float = 0.75,
+                   margin: float = 0.1) -> Span | None:
+    """
+    The best span if it scores at least `threshold` and beats the best
+    span with a different answer by `margin` (two equally good but
+    different answers mean the question is ambiguous), else None.
+    """
+    spans = candidate_spans(query, hits)
+    if not spans or spans[0].score < threshold:
+        return None
+    best = spans[0]
+    for other in spans[1:]:
+        if not _same_answer(other.text, best.text):
+            if best.score - other.score < margin:
+                return None
+            break
+    return best
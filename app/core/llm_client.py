@@ -1,33 +1,527 @@
 # app/core/llm_client.py
 
+import asyncio
 import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from dotenv import load_dotenv
+import httpx
 import openai
 
+from app.core.completion_cache import CompletionCache, get_completion_cache
+
 # ─── Load .env so OPENAI_API_KEY is available ─────────────────────────
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    raise RuntimeError("Please set OPENAI_API_KEY in your environment")
 
-def call_llm(
-    messages: list[dict],
-    model: str = "gpt-3.5-turbo",
-    temperature: float = 0.0,
-    max_tokens: int = 256
-) -> str:
+# ─── Client settings (all overridable from .env) ──────────────────────
+OPENAI_BASE_URL        = os.getenv("OPENAI_BASE_URL") or None   # e.g. a local fake server
+OPENAI_TIMEOUT         = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES     = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE   = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+LLM_HEDGE              = os.getenv("LLM_HEDGE", "0") not in ("0", "false", "no")
+LLM_HEDGE_MIN_SAMPLES  = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
     """
-    Send a chat completion request via the OpenAI v1 Chat API.
-    `messages` is a list of {"role": "system"|"user"|"assistant", "content": str}.
-    Returns the assistant's reply content.
+    OpenAI chat/embedding client built for serving:
+
+      • one keep-alive httpx pool per client (sync and async),
+      • a deadline per call that covers every retry,
+      • jittered exponential backoff on 429 / 5xx / timeouts / connection
+        errors (honouring Retry-After),
+      • optional hedging: if the first attempt is slower than the observed
+        p95 latency, a duplicate is sent and whichever finishes first wins.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+    ):
+        self.api_key           = api_key or openai.api_key
+        self.base_url          = base_url
+        self.timeout           = timeout
+        self.max_retries       = max_retries
+        self.backoff_base      = backoff_base
+        self.backoff_max       = backoff_max
+        self.hedge             = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        # retries are handled here, not inside the SDK
+        self._sync = openai.OpenAI(
+            api_key=self.api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,
+            http_client=httpx.Client(limits=self._limits),
+        )
+        self._async       = None
+        self._latencies   = deque(maxlen=500)
+        self._lat_lock    = threading.Lock()
+        # hedged attempts; as many as the HTTP pool can carry
+        self._hedge_pool  = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="llm-hedge")
+        self.retries      = 0
+        self.hedges       = 0
+        self._stats_lock  = threading.Lock()
+        self.usage: dict[tuple, int] = {}   # (model, "prompt"|"completion") → tokens
+        self._usage_lock  = threading.Lock()
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        if self._async is None:
+            self._async = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self._limits),
+            )
+        return self._async
+
+    # ─── Retry / hedging policy ─────────────────────────────────────────
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        hinted = _retry_after(exc)
+        if hinted is not None:
+            return min(hinted, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, seconds: float):
+        with self._lat_lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float | None:
+        """
+        p95 of recent successful call latencies, or None while there are
+        too few samples (or hedging is off).
+        """
+        if not self.hedge:
+            return None
+        with self._lat_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def _timed(self, fn, timeout: float):
+        start  = time.monotonic()
+        result = fn(timeout)
+        self._record(time.monotonic() - start)
+        return result
+
+    async def _atimed(self, fn, timeout: float):
+        start  = time.monotonic()
+        result = await fn(timeout)
+        self._record(time.monotonic() - start)
+        return result
+
+    def _attempt(self, fn, timeout: float, hedge: bool = True):
+        """
+        One attempt on the caller's thread, or, once hedging is active, on
+        the hedge pool with a duplicate sent if it is still running after
+        the hedge delay; the first to succeed wins. A blocking request
+        cannot be aborted, so the loser finishes in the background and its
+        result is dropped.
+        """
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or delay >= timeout:
+            return self._timed(fn, timeout)
+        deadline = time.monotonic() + timeout
+        pending  = {self._hedge_pool.submit(self._timed, fn, timeout)}
+        try:
+            done, pending = wait(pending, timeout=delay)
+            if done:
+                return done.pop().result()
+            with self._stats_lock:
+                self.hedges += 1
+            pending.add(self._hedge_pool.submit(self._timed, fn, max(deadline - time.monotonic(), 0.001)))
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = error or future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _aattempt(self, fn, timeout: float, hedge: bool = True):
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or delay >= timeout:
+            return await self._atimed(fn, timeout)
+        pending = {asyncio.ensure_future(self._atimed(fn, timeout))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return done.pop().result()
+            with self._stats_lock:
+                self.hedges += 1
+            pending.add(asyncio.ensure_future(self._atimed(fn, max(timeout - delay, 0.001))))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # also reached when the caller is cancelled
+            for task in pending:
+                task.cancel()
+
+    def _call(self, fn, timeout: float | None = None, hedge: bool = True):
+        """
+        Run fn(per_attempt_timeout) with retries inside one overall deadline.
+        """
+        budget   = timeout or self.timeout
+        deadline = time.monotonic() + budget
+        attempt  = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call exceeded its {budget:.1f}s deadline")
+            try:
+                return self._attempt(fn, remaining, hedge)
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                pause = self._backoff(attempt, e)
+                if time.monotonic() + pause >= deadline:
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                attempt += 1
+                time.sleep(pause)
+
+    async def _acall(self, fn, timeout: float | None = None, hedge: bool = True):
+        budget   = timeout or self.timeout
+        deadline = time.monotonic() + budget
+        attempt  = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call exceeded its {budget:.1f}s deadline")
+            try:
+                return await self._aattempt(fn, remaining, hedge)
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                pause = self._backoff(attempt, e)
+                if time.monotonic() + pause >= deadline:
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                attempt += 1
+                await asyncio.sleep(pause)
+
+    def _add_usage(self, model: str, usage):
+        if usage is None:
+            return
+        with self._usage_lock:
+            for kind in ("prompt", "completion"):
+                n = getattr(usage, f"{kind}_tokens", None) or 0
+                if n:
+                    key = (model, kind)
+                    self.usage[key] = self.usage.get(key, 0) + n
+
+    # ─── Public API ─────────────────────────────────────────────────────
+    def complete(self, messages: list[dict], timeout: float | None = None, **params) -> str:
+        resp = self._call(
+            lambda t: self._sync.chat.completions.create(messages=messages, timeout=t, **params),
+            timeout,
+        )
+        self._add_usage(resp.model, resp.usage)
+        return resp.choices[0].message.content.strip()
+
+    async def acomplete(self, messages: list[dict], timeout: float | None = None, **params) -> str:
+        client = self.async_client
+        resp = await self._acall(
+            lambda t: client.chat.completions.create(messages=messages, timeout=t, **params),
+            timeout,
+        )
+        self._add_usage(resp.model, resp.usage)
+        return resp.choices[0].message.content.strip()
+
+    def stream(self, messages: list[dict], timeout: float | None = None, **params):
+        """
+        Yield content deltas. Retries apply until the stream is opened;
+        streams are never hedged.
+        """
+        stream = self._call(
+            lambda t: self._sync.chat.completions.create(
+                messages=messages, stream=True, timeout=t,
+                stream_options={"include_usage": True}, **params
+            ),
+            timeout,
+            hedge=False,
+        )
+        for chunk in stream:
+            self._add_usage(chunk.model, getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def astream(self, messages: list[dict], timeout: float | None = None, **params):
+        client = self.async_client
+        stream = await self._acall(
+            lambda t: client.chat.completions.create(
+                messages=messages, stream=True, timeout=t,
+                stream_options={"include_usage": True}, **params
+            ),
+            timeout,
+            hedge=False,
+        )
+        async for chunk in stream:
+            self._add_usage(chunk.model, getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def embed(self, texts: list[str], model: str = EMBEDDING_MODEL,
+              timeout: float | None = None) -> list[list[float]]:
+        resp = self._call(
+            lambda t: self._sync.embeddings.create(model=model, input=texts, timeout=t),
+            timeout,
+        )
+        self._add_usage(model, resp.usage)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+    async def aembed(self, texts: list[str], model: str = EMBEDDING_MODEL,
+                     timeout: float | None = None) -> list[list[float]]:
+        client = self.async_client
+        resp = await self._acall(
+            lambda t: client.embeddings.create(model=model, input=texts, timeout=t),
+            timeout,
+        )
+        self._add_usage(model, resp.usage)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def stats(self) -> dict:
+        return {
+            "retries":     self.retries,
+            "hedges":      self.hedges,
+            "hedge_delay": self.hedge_delay(),
+            "samples":     len(self._latencies),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """
+    Process-wide LLMClient configured from the environment, created on
+    first use (so importing this module never needs the API key).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not openai.api_key:
+                    raise RuntimeError("Please set OPENAI_API_KEY in your environment")
+                _client = LLMClient(
+                    base_url=OPENAI_BASE_URL,
+                    timeout=OPENAI_TIMEOUT,
+                    max_retries=OPENAI_MAX_RETRIES,
+                    hedge=LLM_HEDGE,
+                    hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive=OPENAI_MAX_KEEPALIVE,
+                )
+    return _client
+
+
+def token_usage() -> dict:
+    """
+    {(model, "prompt"|"completion"): tokens} since start; empty until the
+    client has been created.
+    """
+    if _client is None:
+        return {}
+    with _client._usage_lock:
+        return dict(_client.usage)
+
+
+def client_stats() -> dict:
+    """
+    Retry/hedging counters of the shared client (empty until created).
     """
-    resp = openai.ChatCompletion.create(
+    return _client.stats() if _client is not None else {}
+
+
+def transient_backoff(exc: Exception, attempt: int, base: float = 1.0,
+                      cap: float = 60.0) -> float | None:
+    """
+    Seconds to wait before retrying a whole call that failed with `exc`
+    (Retry-After if the server sent one, else jittered exponential
+    backoff), or None when the error is not transient.
+    """
+    if not (_is_retryable(exc) or isinstance(exc, TimeoutError)):
+        return None
+    hinted = _retry_after(exc)
+    if hinted is not None:
+        return min(hinted, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _chat_params(model: str, temperature: float, max_tokens: int) -> dict:
+    return dict(
         model=model,
-        messages=messages,
         temperature=temperature,
         max_tokens=max_tokens,
         top_p=1.0,
         frequency_penalty=0.0,
         presence_penalty=0.0,
     )
-    return resp.choices[0].message.content.strip()
+
+
+def _cache_key(messages: list[dict], params: dict) -> str | None:
+    """
+    Completion-cache key for a deterministic request, else None.
+    """
+    if params["temperature"] != 0 or get_completion_cache() is None:
+        return None
+    return CompletionCache.key(params["model"], messages, params)
+
+
+async def _off_loop(fn, *args):
+    # completion-cache SQLite calls can wait on another writer's lock
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+def call_llm(
+    messages: list[dict],
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.0,
+    max_tokens: int = 256,
+    timeout: float | None = None,
+    cache_if=None,
+) -> str:
+    """
+    Send a chat completion request via the OpenAI v1 Chat API.
+    `messages` is a list of {"role": "system"|"user"|"assistant", "content": str}.
+    Returns the assistant's reply content. Requests at temperature 0 are
+    served from / stored in the completion cache; with `cache_if`, only
+    replies for which cache_if(reply) is true are stored or served.
+    """
+    params = _chat_params(model, temperature, max_tokens)
+    key    = _cache_key(messages, params)
+    if key is not None:
+        cached = get_completion_cache().get(key)
+        if cached is not None and (cache_if is None or cache_if(cached)):
+            return cached
+    answer = get_client().complete(messages, timeout=timeout, **params)
+    if key is not None and (cache_if is None or cache_if(answer)):
+        get_completion_cache().put(key, model, answer)
+    return answer
+
+
+async def acall_llm(
+    messages: list[dict],
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.0,
+    max_tokens: int = 256,
+    timeout: float | None = None
+) -> str:
+    """
+    Async counterpart of call_llm(); does not block the event loop
+    (completion-cache lookups and writes run on the default executor).
+    """
+    params = _chat_params(model, temperature, max_tokens)
+    key    = _cache_key(messages, params)
+    if key is not None:
+        cached = await _off_loop(get_completion_cache().get, key)
+        if cached is not None:
+            return cached
+    answer = await get_client().acomplete(messages, timeout=timeout, **params)
+    if key is not None:
+        await _off_loop(get_completion_cache().put, key, model, answer)
+    return answer
+
+
+def stream_llm(
+    messages: list[dict],
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.0,
+    max_tokens: int = 256
+):
+    """
+    Streaming variant of call_llm(): yields content deltas as they arrive
+    (a cached completion arrives as one delta).
+    """
+    params = _chat_params(model, temperature, max_tokens)
+    key    = _cache_key(messages, params)
+    if key is not None:
+        cached = get_completion_cache().get(key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    for delta in get_client().stream(messages, **params):
+        parts.append(delta)
+        yield delta
+    if key is not None:
+        get_completion_cache().put(key, model, "".join(parts).strip())
+
+
+async def astream_llm(
+    messages: list[dict],
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.0,
+    max_tokens: int = 256
+):
+    """
+    Async streaming variant: an async generator of content deltas.
+    """
+    params = _chat_params(model, temperature, max_tokens)
+    key    = _cache_key(messages, params)
+    if key is not None:
+        cached = await _off_loop(get_completion_cache().get, key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    async for delta in get_client().astream(messages, **params):
+        parts.append(delta)
+        yield delta
+    if key is not None:
+        await _off_loop(get_completion_cache().put, key, model, "".join(parts).strip())
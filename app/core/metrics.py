@@ -0,0 +1,108 @@
+# app/core/metrics.py
+
+from typing import Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# ─── Request / stage latency ──────────────────────────────────────────
+# Buckets span cached lookups (~1 ms) to slow LLM calls (~30 s).
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "chat_request_seconds", "End-to-end chat request latency",
+    ["endpoint"], buckets=_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "rag_stage_seconds",
+    "Time spent per RAG stage (direct_lookup, lexical, embedding, "
+    "vector_query, extractive, pack, llm, llm_first_token)",
+    ["stage"], buckets=_BUCKETS,
+)
+
+# ─── Outcomes ─────────────────────────────────────────────────────────
+ANSWERS = Counter(
+    "rag_answers_total",
+    "Answers by path: direct (pre-rendered), cache (semantic cache), "
+    "extractive (span of the retrieved chunks, no LLM), lexical (BM25 "
+    "fast path + LLM), session (follow-up on the previous turn's pages "
+    "+ LLM) or rag (hybrid retrieval + LLM)",
+    ["path"],
+)
+BOOKING_INTENTS = Counter(
+    "booking_intents_total", "Booking commands seen in chat",
+    ["intent", "outcome"],
+)
+CHAT_ERRORS = Counter(
+    "chat_errors_total", "Chat requests that failed", ["endpoint"],
+)
+
+
+def stage(name: str):
+    """
+    Context manager / decorator timing one RAG stage.
+    """
+    return STAGE_LATENCY.labels(name).time()
+
+
+# ─── Pull-based stats from caches and clients ─────────────────────────
+class _StatsCollector:
+    """
+    Exposes counters the app already keeps (cache hit/miss, batching,
+    retries, token usage) at scrape time instead of double-counting them.
+    """
+
+    def __init__(self):
+        self._gauges: dict[str, Callable[[], dict]] = {}
+        self._counters: dict[str, tuple[str, list[str], Callable[[], dict]]] = {}
+
+    def collect(self):
+        for prefix, fn in self._gauges.items():
+            try:
+                stats = fn() or {}
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f"{prefix}_{key}", f"{prefix} {key}", value=value)
+        for name, (doc, labels, fn) in self._counters.items():
+            try:
+                values = fn() or {}
+            except Exception:
+                continue
+            family = CounterMetricFamily(name, doc, labels=labels)
+            for label_values, value in values.items():
+                family.add_metric(list(label_values), value)
+            yield family
+
+
+_collector = _StatsCollector()
+REGISTRY.register(_collector)
+
+
+def register_stats(prefix: str, fn: Callable[[], dict]):
+    """
+    Export every numeric value of `fn()` as gauge `{prefix}_{key}`.
+    """
+    _collector._gauges[prefix] = fn
+
+
+def register_counter(name: str, documentation: str, labels: list[str],
+                     fn: Callable[[], dict]):
+    """
+    Export `fn()` ({(label values...): total}) as a labelled counter.
+    """
+    _collector._counters[name] = (documentation, labels, fn)
+
+
+def render() -> tuple[bytes, str]:
+    """
+    (body, content type) for a /metrics response.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,178 @@
+# app/core/page_index.py
+
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+
+from app.core.bm25 import tokenize
+from app.core.direct_answers import TABLE_FILE, load_table, render_page
+
+logger = logging.getLogger(__name__)
+
+_DAYS_PREFIX = re.compile(r"^(\d+)-days-")
+
+
+def normalize_sections(raw) -> dict:
+    """
+    Structured JSON stores sections either as a dict or as a list of
+    {header, content}; collapse both into one header → content dict.
+    """
+    if isinstance(raw, dict):
+        return dict(raw)
+    sections = {}
+    for s in raw or []:
+        if isinstance(s, dict) and s.get("header") is not None:
+            sections.setdefault(s["header"], s.get("content"))
+    return sections
+
+
+class PageIndex:
+    """
+    In-memory index of every `*_structured.json` page in a processed_data
+    directory, keyed by page_id and by day-count, plus the pre-rendered
+    direct answers (from the ingest-time table, rendered here if stale).
+
+    The directory is re-scanned at most every `check_interval` seconds and
+    only reloaded when a file is added, removed or its mtime changes, so
+    the request path never touches the filesystem otherwise.
+    """
+
+    def __init__(self, processed_dir: Path, check_interval: float = 5.0):
+        self.processed_dir  = Path(processed_dir)
+        self.check_interval = check_interval
+        self.pages: dict[str, dict]      = {}   # page_id → page
+        self.by_days: dict[int, list]    = {}   # "N-days-…" prefix → [page_id, ...]
+        self.by_travel_days: dict[int, list] = {}   # sections.travel_days → [page_id, ...]
+        self.answers: dict[str, dict]    = {}   # page_id → {section_key: answer}
+        self.by_name: dict[str, list]    = {}   # distinctive page_id/title token → [page_id, ...]
+        self.version     = 0                   # bumped on every reload
+        self._fingerprint = None
+        self._checked_at  = 0.0
+        self._lock        = threading.Lock()
+        self.refresh(force=True)
+
+    # ─── Loading ─────────────────────────────────────────────────────────
+    def _scan(self) -> dict:
+        files = {}
+        if self.processed_dir.exists():
+            for p in self.processed_dir.glob("*_structured.json"):
+                try:
+                    files[p] = p.stat().st_mtime_ns
+                except OSError:
+                    continue
+            table = self.processed_dir / TABLE_FILE
+            if table.exists():
+                files[table] = table.stat().st_mtime_ns
+        return files
+
+    def _load(self, files: dict):
+        pages, by_days, by_travel_days, answers, by_name = {}, {}, {}, {}, {}
+        table_path = self.processed_dir / TABLE_FILE
+        table_mtime = files.pop(table_path, None)
+        table = load_table(table_path) if table_mtime is not None else {}
+
+        for path in sorted(files):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable page {path.name}: {e}")
+                continue
+
+            page_id  = data.get("page_id") or path.stem.replace("_structured", "")
+            sections = normalize_sections(data.get("sections", {}))
+            page = {
+                "page_id":    page_id,
+                "page_title": data.get("page_title", path.stem),
+                "url":        data.get("url", ""),
+                "sections":   sections,
+                "chunks":     data.get("chunks", []),
+                "path":       path,
+            }
+            pages[page_id] = page
+
+            # use the ingest-time table unless the page is newer than it
+            if page_id in table and files[path] <= table_mtime:
+                answers[page_id] = table[page_id]
+            else:
+                answers[page_id] = render_page(page["page_title"], sections)
+
+        for page_id, page in pages.items():
+            m = _DAYS_PREFIX.match(page_id)
+            if m:
+                by_days.setdefault(int(m.group(1)), []).append(page_id)
+            days = page["sections"].get("travel_days")
+            if isinstance(days, int):
+                by_travel_days.setdefault(days, []).append(page_id)
+
+        # tokens that name a tour: in a page's id or title, but in at most
+        # half of the pages ("package", "hunza" or "days" name none)
+        for page_id, page in pages.items():
+            for token in set(tokenize(f"{page_id.replace('-', ' ')} {page['page_title']}")):
+                if not token.isdigit():
+                    by_name.setdefault(token, []).append(page_id)
+        by_name = {t: ids for t, ids in by_name.items() if 2 * len(ids) <= len(pages)}
+
+        return pages, by_days, by_travel_days, answers, by_name
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload the index if any structured JSON changed.
+        Returns True when a reload happened.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            files = self._scan()
+            fingerprint = frozenset(files.items())
+            if not force and fingerprint == self._fingerprint:
+                return False
+            pages, by_days, by_travel_days, answers, by_name = self._load(dict(files))
+            # swap in fully built dicts so readers never see a half-built index
+            self.pages, self.by_days, self.by_travel_days, self.answers, self.by_name = (
+                pages, by_days, by_travel_days, answers, by_name
+            )
+            self._fingerprint = fingerprint
+            self.version += 1
+            logger.info(f"Loaded {len(pages)} pages from {self.processed_dir}")
+            return True
+
+    # ─── Lookups ─────────────────────────────────────────────────────────
+    def get(self, page_id: str) -> dict | None:
+        self.refresh()
+        return self.pages.get(page_id)
+
+    def find_by_days(self, days: int, prefer: str | None = None) -> dict | None:
+        """
+        First page for an N-day tour, preferring ids containing `prefer`.
+        Pages named "N-days-…" win; the travel_days field is the fallback.
+        """
+        self.refresh()
+        candidates = self.by_days.get(days) or self.by_travel_days.get(days, [])
+        if prefer:
+            preferred = [pid for pid in candidates if prefer in pid]
+            candidates = preferred or candidates
+        return self.pages[candidates[0]] if candidates else None
+
+    def named_pages(self, tokens: list[str]) -> set[str]:
+        """
+        Page ids whose id or title is named by any of the (tokenized) words.
+        """
+        self.refresh()
+        return {page_id for t in tokens for page_id in self.by_name.get(t, ())}
+
+    def answer(self, page_id: str, section_key: str) -> str | None:
+        """
+        Pre-rendered direct answer for a page section.
+        """
+        return self.answers.get(page_id, {}).get(section_key)
+
+    def __len__(self):
+        return len(self.pages)
+
@@ -1,12 +1,27 @@
 # app/core/rag_pipeline.py
+import os
 import re
-import os, json
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import NamedTuple
 from dotenv import load_dotenv
 
-import openai
-from chromadb import PersistentClient
-from app.core.llm_client import call_llm
+from app.core.llm_client import call_llm, acall_llm, astream_llm, get_client, token_usage, client_stats
+from app.core.cache import TTLCache
+from app.core.completion_cache import completion_cache_stats
+from app.core.tenants import TenantContext, TenantRegistry
+from app.core.direct_answers import match_intent
+from app.core.bm25 import BM25Index, Hit, reciprocal_rank_fusion, tokenize
+from app.core.embedding_batcher import EmbeddingBatcher
+from app.core.context_packer import pack_context
+from app.core.extractive import extract_answer
+from app.core.sessions import Conversation, SessionStore, fold_turn
+from app.core import metrics
+from app.ingestion.embedder import check_collection, embedding_store_stats, get_embedder, get_query_embedder
+from app.core.metrics import ANSWERS, stage
 
 load_dotenv()
 COMPANY   = os.getenv("COMPANY_NAME", "my_company")
@@ -14,155 +29,663 @@ DB_PATH   = os.getenv("VECTORSTORE_PATH", f"vectorstores/{COMPANY}/chroma.sqlite
 BASE_DIR  = Path(__file__).parent.parent.parent
 PROCESSED = BASE_DIR / "processed_data" / COMPANY
 
-openai.api_key = os.getenv("OPENAI_API_KEY") or ""
-if not openai.api_key:
-    raise RuntimeError("Please set OPENAI_API_KEY in your environment")
+# ─── Tenants: one Chroma collection + page index per tour operator ────
+# COMPANY is the default tenant (VECTORSTORE_PATH / NUMPY_INDEX_PATH still
+# apply to it); any other tenant `t` lives in vectorstores/t/chroma.sqlite3
+# and processed_data/t. Nothing is opened at import time: a tenant's
+# resources are created on first use (or by warmup()) and the least
+# recently used tenants are closed past TENANT_MAX_OPEN / TENANT_MAX_MEMORY_MB.
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma").lower()
+NUMPY_INDEX_PATH  = os.getenv("NUMPY_INDEX_PATH", str(Path(DB_PATH).parent / "numpy_index"))
+if RETRIEVAL_BACKEND not in ("chroma", "numpy"):
+    raise RuntimeError(f"Unknown RETRIEVAL_BACKEND: {RETRIEVAL_BACKEND}")
 
-client     = PersistentClient(path=DB_PATH)
-collection = client.get_or_create_collection(name="docs")
+TENANTS = TenantRegistry(
+    vectorstore_root=Path(os.getenv("TENANT_VECTORSTORE_ROOT", "vectorstores")),
+    processed_root=Path(os.getenv("TENANT_PROCESSED_ROOT", str(BASE_DIR / "processed_data"))),
+    max_open=int(os.getenv("TENANT_MAX_OPEN", "16")),
+    max_bytes=int(float(os.getenv("TENANT_MAX_MEMORY_MB", "1024")) * 1024 * 1024),
+    overrides={COMPANY.lower(): {
+        "db_path":          DB_PATH,
+        "processed_dir":    PROCESSED,
+        "numpy_index_path": NUMPY_INDEX_PATH,
+    }},
+    backend=RETRIEVAL_BACKEND,
+    page_check_interval=float(os.getenv("PAGE_INDEX_CHECK_INTERVAL", "5")),
+    vectorstore_check_interval=float(os.getenv("VECTORSTORE_CHECK_INTERVAL", "5")),
+    answer_cache_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+    answer_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    answer_cache_ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+)
+
+
+def get_tenant(tenant_id: str | None = None, acquire: bool = False) -> TenantContext:
+    """
+    TenantContext for `tenant_id` (default: COMPANY). Raises ValueError for
+    a malformed id and TenantNotFound for an unknown one. Requests pass
+    acquire=True and release() the context when done, so LRU eviction
+    never closes it under them.
+    """
+    return TENANTS.get(tenant_id or COMPANY, acquire=acquire)
+
+
+# ─── Query-embedding cache (LRU + TTL, keyed on normalized text) ──────
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL  = float(os.getenv("EMBED_CACHE_TTL", "3600"))
+_embedding_cache = TTLCache(maxsize=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form used as cache key: lowercase, single spaces,
+    no trailing punctuation.
+    """
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    One call to the configured embedding provider, in input order.
+    """
+    return get_query_embedder().embed(texts)
+
+
+# ─── Micro-batching of concurrent cache misses ────────────────────────
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "1") not in ("0", "false", "no")
+_embedding_batcher = EmbeddingBatcher(
+    embed_texts,
+    window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+    max_batch=int(os.getenv("EMBED_BATCH_MAX", "64")),
+    max_inflight=int(os.getenv("EMBED_BATCH_INFLIGHT", "4")),
+    timeout=float(os.getenv("EMBED_BATCH_TIMEOUT", "30")),
+)
 
 
 def get_query_embedding(text: str) -> list[float]:
-    resp = openai.Embedding.create(
-        model="text-embedding-ada-002",
-        input=text
-    )
-    return resp.data[0].embedding
-
-
-def find_exact_page(query: str) -> Path | None:
-    """
-    If the query mentions an N-Day tour, try to find
-    a {N}-days-*.json file under processed_data.
-    """
-    m = re.search(r"(\d+)[-\s]*day", query.lower())
-    if m:
-        n = m.group(1)
-        # gather all JSONs whose stem starts with "{n}-days"
-        candidates = [
-            p for p in PROCESSED.glob(f"{n}-days-*_structured.json")
-            if "hunza" in p.stem
-        ]
-        if not candidates:
-            # fallback: any {n}-days file
-            candidates = list(PROCESSED.glob(f"{n}-days-*_structured.json"))
-        if candidates:
-            return candidates[0]
+    key = normalize_query(text)
+    emb = _embedding_cache.get(key)
+    if emb is not None:
+        return emb
+
+    with stage("embedding"):
+        if EMBED_BATCHING:
+            emb = _embedding_batcher.embed(text)
+        else:
+            emb = embed_texts([text])[0]
+    _embedding_cache.set(key, emb)
+    return emb
+
+
+def embedding_batcher_stats() -> dict:
+    """
+    Batches sent / texts embedded by the micro-batcher.
+    """
+    return _embedding_batcher.stats()
+
+
+def embedding_cache_stats() -> dict:
+    """
+    Hit/miss counters of the query-embedding cache.
+    """
+    return _embedding_cache.stats()
+
+
+def answer_cache_stats() -> dict:
+    """
+    Hit/miss counters of the semantic answer caches, summed over the
+    currently open tenants.
+    """
+    hits = misses = size = 0
+    for ctx in TENANTS.open_contexts():
+        st = ctx.answer_cache.stats()
+        hits, misses, size = hits + st["hits"], misses + st["misses"], size + st["size"]
+    total = hits + misses
+    return {"size": size, "hits": hits, "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0}
+
+
+# ─── Exported on /metrics ─────────────────────────────────────────────
+metrics.register_stats("rag_embedding_cache", embedding_cache_stats)
+metrics.register_stats("rag_answer_cache", answer_cache_stats)
+metrics.register_stats("rag_embedding_batcher", embedding_batcher_stats)
+metrics.register_stats("llm_client", client_stats)
+metrics.register_stats("llm_completion_cache", completion_cache_stats)
+metrics.register_stats("embedding_store", embedding_store_stats)
+metrics.register_stats("rag_tenants", TENANTS.stats)
+metrics.register_counter(
+    "llm_tokens", "LLM/embedding tokens reported by the API",
+    ["model", "kind"], token_usage,
+)
+
+
+def find_exact_page(tenant: TenantContext, query: str) -> dict | None:
+    """
+    If the query mentions an N-Day tour, return the tenant's indexed
+    {N}-days-* page (preferring Hunza tours).
+    """
+    days, _ = match_intent(query)
+    if days is not None:
+        return tenant.page_index().find_by_days(days, prefer="hunza")
     return None
 
 
-def direct_json_lookup(query: str):
-    q = query.lower()
-    # map trigger → json key
-    section_map = {
-        "include":    ("what_is_included",   True),
-        "exclude":    ("what_is_excluded",   True),
-        "itinerar":   ("itinerary",          False),
-        "highlight":  ("tour_highlights",    False),
-        "overview":   ("overview",           False),
-        "faq":        ("trip_faqs",          False),
-    }
-    # 1) see if it's an N-day query
-    page_file = find_exact_page(query)
-    if page_file:
-        data = json.loads(page_file.read_text(encoding="utf-8"))
-    else:
-        # 2) else we fallback to best-1 via embedding
-        emb     = get_query_embedding(query)
-        results = collection.query(query_embeddings=[emb], n_results=1)
-        meta    = results["metadatas"][0][0]
-        page_id = meta["page_id"]
-        page_file = PROCESSED / f"{page_id}_structured.json"
-        if not page_file.exists():
-            return None
-        data = json.loads(page_file.read_text(encoding="utf-8"))
-
-    title    = data.get("page_title", page_file.stem)
-    sections = data.get("sections", {})
-
-    # unify list/dict handling
-    def get_section(key):
-        if isinstance(sections, dict):
-            return sections.get(key)
-        else:
-            for s in sections:
-                if s.get("header") == key:
-                    return s.get("content")
+def retrieve(tenant: TenantContext, q_emb: list[float], top_k: int = 3):
+    """
+    Top-k chunks for a query embedding from the tenant's backend.
+    Returns (ids, documents, metadatas), best first.
+    """
+    index = tenant.numpy_index()
+    with stage("vector_query"):
+        if index is not None:
+            ids, docs, metadatas, _ = index.search(q_emb, top_k)
+            return ids, docs, metadatas
+        results = tenant.collection().query(query_embeddings=[q_emb], n_results=top_k)
+    return results["ids"][0], results["documents"][0], results["metadatas"][0]
+
+
+def _best_page(tenant: TenantContext, q_emb: list[float]) -> dict | None:
+    """
+    Best-1 vector hit → its indexed page.
+    """
+    _, _, metadatas = retrieve(tenant, q_emb, top_k=1)
+    if not metadatas:
         return None
+    return tenant.page_index().get(metadatas[0]["page_id"])
 
-    # 3) find which section they want
-    for token, (sec_key, is_list) in section_map.items():
-        if token in q:
-            sec = get_section(sec_key)
-            if sec_key in ("what_is_included", "what_is_excluded") and isinstance(sec, list) and sec:
-                items = sec
-                body  = (
-                    items[0] if len(items)==1
-                    else ", ".join(items[:-1]) + " and " + items[-1]
-                )
-                verb = "includes" if sec_key=="what_is_included" else "excludes"
-                answer = (
-                    f"For the “{title}” package, the tour {verb} "
-                    f"{body}."
-                )
-                return answer, [data.get("page_id")]
-
-            if sec_key == "itinerary" and isinstance(sec, dict):
-                lines = []
-                for day, plan in sec.items():
-                    detail = "; ".join(plan) if isinstance(plan, list) else str(plan)
-                    lines.append(f"{day}: {detail}")
-                answer = f"Here’s the itinerary for “{title}”: " + " | ".join(lines)
-                return answer, [data.get("page_id")]
-
-            if sec_key == "tour_highlights" and isinstance(sec, list) and sec:
-                top3 = sec[:3]
-                answer = (
-                    f"Key highlights of “{title}” include "
-                    f"{', '.join(top3[:-1])} and {top3[-1]}."
-                )
-                return answer, [data.get("page_id")]
-
-            # fallback simple sections
-            if sec is not None:
-                if isinstance(sec, list):
-                    answer = "; ".join(str(x) for x in sec)
-                else:
-                    answer = str(sec)
-                return answer, [data.get("page_id")]
-
-            return None
-    return None
 
+# ─── Lexical (BM25) retrieval over the same chunks ────────────────────
+# Each tenant's index is rebuilt whenever its pages reload. A confident
+# BM25 result skips the embedding call; otherwise BM25 and vector
+# rankings are fused (RRF).
+BM25_MIN_SCORE = float(os.getenv("BM25_MIN_SCORE", "5.0"))
+BM25_MARGIN    = float(os.getenv("BM25_MARGIN", "0.25"))
 
-def run_rag(query: str, top_k: int = 3):
-    # 1) try direct JSON lookup (with exact N-day matching)
-    direct = direct_json_lookup(query)
-    if direct:
-        return direct
-
-    # 2) fallback to RAG-vector + LLM
-    q_emb   = get_query_embedding(query)
-    results = collection.query(query_embeddings=[q_emb], n_results=top_k)
-    docs      = results["documents"][0]
-    metadatas = results["metadatas"][0]
-
-    system_instructions = (
-        "You are a travel‐specialist assistant **only** trained on the provided context.  "
-        "• **Answer exclusively** from the context below—no external knowledge.  "
-        "• If the user’s question is **not** covered in the context, reply exactly:  "
-        "`I’m sorry, I don’t know about that.`  "
-        "• Keep answers **concise** and **professional**."
+
+def lexical_search(tenant: TenantContext, query: str, top_k: int = 3) -> tuple[list[Hit], bool]:
+    """
+    BM25 candidates for the query and whether they are confident enough
+    to answer from without a vector search.
+    """
+    index = tenant.lexical_index()
+    with stage("lexical"):
+        hits = index.search(query, top_k=2 * top_k)
+    return hits, BM25Index.is_confident(hits, BM25_MIN_SCORE, BM25_MARGIN)
+
+
+def hybrid_retrieve(tenant: TenantContext, q_emb: list[float], lexical_hits: list[Hit],
+                    top_k: int = 3) -> list[Hit]:
+    """
+    Vector top-k fused with the BM25 candidates by reciprocal rank.
+    """
+    ids, docs, metadatas = retrieve(tenant, q_emb, 2 * top_k)
+    vector_hits = [Hit(i, d, m, 0.0) for i, d, m in zip(ids, docs, metadatas)]
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k)
+
+
+# ─── Follow-up questions within a session ─────────────────────────────
+# A short or anaphoric question ("and what about the 7 day one?") is read
+# against the previous turn: it inherits the section asked about and, if
+# it names no other tour, reuses the previous turn's pages instead of
+# embedding and querying again.
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|there|one|same|also|else|"
+    r"what about|how about|and)\b"
+)
+
+
+# words that carry no topic of their own in a follow-up
+_FILLER = frozenset("about and also day days else it its one ones same that them there these they this those".split())
+
+
+def _topic_words(query: str) -> list[str]:
+    return [t for t in tokenize(query) if t not in _FILLER and not t.isdigit()]
+
+
+def is_follow_up(tenant: TenantContext, query: str, conversation: Conversation | None,
+                 lexical: tuple[list[Hit], bool] | None = None) -> bool:
+    """
+    Whether `query` continues the previous turn: it is short or anaphoric,
+    and either has no topic words of its own or names no tour besides the
+    previous turn's, with no confident keyword match on another page.
+    `lexical` is lexical_search()'s result when the caller already has it.
+    """
+    if conversation is None or not conversation.page_ids:
+        return False
+    lowered = query.lower()
+    if not (_FOLLOW_UP.search(lowered) or len(tokenize(lowered)) <= 3):
+        return False
+    topic = _topic_words(lowered)
+    if not topic:
+        return True
+    pages = set(conversation.page_ids)
+    named = tenant.page_index().named_pages(topic)
+    if named and not named & pages:
+        return False
+    hits, confident = lexical or lexical_search(tenant, query)
+    return not (confident and hits[0].metadata.get("page_id") not in pages)
+
+
+def session_hits(tenant: TenantContext, query: str, conversation: Conversation | None,
+                 top_k: int = 3, lexical: tuple[list[Hit], bool] | None = None) -> list[Hit] | None:
+    """
+    Chunks of the previous turn's pages for a follow-up question, best
+    BM25 match first, or None when the question is not a follow-up.
+    """
+    if not is_follow_up(tenant, query, conversation, lexical):
+        return None
+    pages = set(conversation.page_ids)
+    index = tenant.lexical_index()
+    hits  = [h for h in index.search(query, top_k=len(index)) if h.metadata.get("page_id") in pages]
+    if len(hits) < top_k:
+        seen = {h.id for h in hits}
+        for page_id in conversation.page_ids:
+            page = tenant.page_index().get(page_id) or {}
+            for c in page.get("chunks", []):
+                if c["id"] not in seen and len(hits) < top_k:
+                    hits.append(Hit(c["id"], c["text"], c.get("metadata", {}), 0.0))
+    return hits[:top_k] or None
+
+
+def _page_for(tenant: TenantContext, query: str, days: int | None,
+              conversation: Conversation | None = None) -> dict | None:
+    """
+    The page a direct lookup refers to: the N-day page if one was named,
+    else a confident keyword match, else the one tour named by title,
+    else the previous turn's page for a follow-up, else the best-1
+    vector hit.
+    """
+    if days is not None:
+        page = tenant.page_index().find_by_days(days, prefer="hunza")
+        if page is not None:
+            return page
+    hits, confident = lexical_search(tenant, query)
+    if confident:
+        return tenant.page_index().get(hits[0].metadata["page_id"])
+    named = tenant.page_index().named_pages(_topic_words(query))
+    if len(named) == 1:
+        return tenant.page_index().get(named.pop())
+    if days is None and is_follow_up(tenant, query, conversation, (hits, confident)):
+        page = tenant.page_index().get(conversation.page_ids[0])
+        if page is not None:
+            return page
+    return _best_page(tenant, get_query_embedding(query))
+
+
+def _intent(tenant: TenantContext, query: str,
+            conversation: Conversation | None) -> tuple[int | None, str | None]:
+    """
+    match_intent(), except that a follow-up with no topic of its own
+    ("what about the 7 day one?") asks for the previous turn's section.
+    """
+    days, sec_key = match_intent(query)
+    if sec_key is None and not _topic_words(query) and is_follow_up(tenant, query, conversation):
+        sec_key = conversation.section
+    return days, sec_key
+
+
+def direct_json_lookup(query: str, tenant: TenantContext,
+                       conversation: Conversation | None = None):
+    # 1) one pass over the query → (N-day, section) intent
+    days, sec_key = _intent(tenant, query, conversation)
+    if sec_key is None:
+        return None
+    # 2) resolve the page, 3) serve its pre-rendered answer
+    page = _page_for(tenant, query, days, conversation)
+    if page is None:
+        return None
+    answer = tenant.page_index().answer(page["page_id"], sec_key)
+    return (answer, [page["page_id"]]) if answer is not None else None
+
+
+SYSTEM_INSTRUCTIONS = (
+    "You are a travel‐specialist assistant **only** trained on the provided context.  "
+    "• **Answer exclusively** from the context below—no external knowledge.  "
+    "• If the user’s question is **not** covered in the context, reply exactly:  "
+    "`I’m sorry, I don’t know about that.`  "
+    "• Keep answers **concise** and **professional**."
+)
+
+
+# ─── Context packing between retrieval and the LLM ────────────────────
+# Overlapping windows are merged, near-duplicates dropped and the rest
+# added by relevance until RAG_CONTEXT_TOKENS is spent.
+RAG_TOP_K            = int(os.getenv("RAG_TOP_K", "3"))
+RAG_CONTEXT_TOKENS   = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+RAG_DEDUPE_THRESHOLD = float(os.getenv("RAG_DEDUPE_THRESHOLD", "0.8"))
+
+
+def pack_hits(hits: list[Hit]) -> tuple[list[str], list[str]]:
+    """
+    (context blocks, their page_ids) for the prompt.
+    """
+    with stage("pack"):
+        blocks = pack_context(hits, RAG_CONTEXT_TOKENS, RAG_DEDUPE_THRESHOLD)
+    return (
+        [b.document for b in blocks],
+        [b.metadata.get("page_id", "unknown") for b in blocks],
     )
-    context = "\n---\n".join(docs)
+
+
+def build_messages(query: str, docs: list[str],
+                   conversation: Conversation | None = None) -> list[dict]:
+    context  = "\n---\n".join(docs)
     user_msg = f"Context:\n{context}\n\nQuestion: {query}\nAnswer:"
+    if conversation is not None and not conversation.is_empty():
+        history = []
+        if conversation.summary:
+            history.append(f"Earlier in this conversation:\n{conversation.summary}")
+        for q, a in conversation.turns:
+            history.append(f"User: {q}\nAssistant: {a}")
+        user_msg = "Conversation so far:\n" + "\n".join(history) + "\n\n" + user_msg
+    return [
+        {"role": "system",  "content": SYSTEM_INSTRUCTIONS},
+        {"role": "user",    "content": user_msg}
+    ]
 
-    answer = call_llm(
-        messages=[
-            {"role": "system",  "content": system_instructions},
-            {"role": "user",    "content": user_msg}
-        ],
-        max_tokens=150
-    )
-    sources = [md.get("page_id", "unknown") for md in metadatas]
-    return answer, sources
+
+# ─── Extractive answers ───────────────────────────────────────────────
+# When an FAQ answer or sentence of the retrieved chunks matches the
+# question closely enough it is served verbatim and the LLM is skipped.
+# Follow-ups always go to the LLM, which sees the conversation.
+EXTRACTIVE_ANSWERS   = os.getenv("EXTRACTIVE_ANSWERS", "1") not in ("0", "false", "no")
+EXTRACTIVE_THRESHOLD = float(os.getenv("EXTRACTIVE_THRESHOLD", "0.75"))
+EXTRACTIVE_MARGIN    = float(os.getenv("EXTRACTIVE_MARGIN", "0.1"))
+
+
+class RagAnswer(NamedTuple):
+    answer: str
+    sources: list
+    mode: str      # "direct" | "cache" | "extractive" | "llm"
+
+
+def extractive_answer(query: str, hits: list[Hit], follow_up=None) -> RagAnswer | None:
+    if not EXTRACTIVE_ANSWERS or follow_up:
+        return None
+    with stage("extractive"):
+        span = extract_answer(query, hits, EXTRACTIVE_THRESHOLD, EXTRACTIVE_MARGIN)
+    if span is None:
+        return None
+    ANSWERS.labels("extractive").inc()
+    return RagAnswer(span.text, [span.page_id], "extractive")
+
+
+def run_rag(query: str, tenant: TenantContext | None = None, top_k: int = RAG_TOP_K,
+            conversation: Conversation | None = None):
+    """
+    Answer `query` from `tenant`'s content (default: COMPANY), reading
+    follow-ups against `conversation` (a session snapshot) when given.
+    Returns a RagAnswer (answer, sources, mode).
+
+    Synchronous form of run_rag_async() for Flask, scripts and worker
+    threads: every step runs on the calling thread, so it must not be
+    called from inside a running event loop.
+    """
+    return asyncio.run(_collect(
+        stream_rag_async(query, tenant, top_k, conversation, stream=False, blocking=True)
+    ))
+
+
+# ─── Server-side chat sessions ────────────────────────────────────────
+SESSION_SUMMARY_LLM = os.getenv("SESSION_SUMMARY_LLM", "0") not in ("0", "false", "no")
+
+
+def summarize_with_llm(summary: str, question: str, answer: str, max_chars: int) -> str:
+    """
+    Fold one turn into the running summary with the LLM (SESSION_SUMMARY_LLM=1);
+    falls back to fold_turn() on any error.
+    """
+    try:
+        text = call_llm(
+            messages=[
+                {"role": "system", "content": (
+                    "Update the running summary of a travel chat. Keep tour names, "
+                    "durations, dates and the traveller's preferences; drop pleasantries. "
+                    f"Reply with the new summary only, under {max_chars} characters."
+                )},
+                {"role": "user", "content": (
+                    f"Summary so far:\n{summary or '(empty)'}\n\n"
+                    f"New turn:\nUser: {question}\nAssistant: {answer}"
+                )},
+            ],
+            max_tokens=max(32, max_chars // 4),
+        )
+        return text[:max_chars]
+    except Exception:
+        return fold_turn(summary, question, answer, max_chars)
+
+
+SESSIONS = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+    max_bytes=int(float(os.getenv("SESSION_MAX_MB", "64")) * 1024 * 1024),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+    keep_turns=int(os.getenv("SESSION_KEEP_TURNS", "3")),
+    summary_chars=int(os.getenv("SESSION_SUMMARY_CHARS", "600")),
+    summarize=summarize_with_llm if SESSION_SUMMARY_LLM else fold_turn,
+)
+metrics.register_stats("rag_sessions", SESSIONS.stats)
+
+
+def remember_turn(tenant: TenantContext, session_id: str, query: str, answer: str,
+                  sources: list[str]):
+    """
+    Record a finished turn; the section asked about carries over to
+    follow-ups that don't name one.
+    """
+    _, section = match_intent(query)
+    SESSIONS.record(tenant.tenant_id, session_id, query, answer, sources, section)
+
+
+def _path(confident: bool, follow_up) -> str:
+    return "lexical" if confident else "session" if follow_up else "rag"
+
+
+# ─── Warmup / readiness ───────────────────────────────────────────────
+_ready_state = {"ready": False, "error": None, "timings": {}}
+
+
+def warmup(tenant: TenantContext | None = None) -> dict:
+    """
+    Build every lazy resource of `tenant` (default: COMPANY) and run one
+    retrieval end to end (using a stored embedding, so no API call),
+    recording per-step timings in seconds. Safe to call repeatedly;
+    readiness() reports the outcome of the last call.
+    """
+    timings = {}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        timings[name] = round(time.perf_counter() - t0, 4)
+        return result
+
+    if tenant is None:
+        with TENANTS.lease(COMPANY) as tenant:
+            return warmup(tenant)
+
+    try:
+        step("llm_client", get_client)
+        index = step("numpy_index", tenant.numpy_index)
+        if index is None:
+            collection = step("chroma", tenant.collection)
+            step("embedder", lambda: check_collection(collection, get_embedder()))
+            embeddings = step("sample", lambda: collection.peek(limit=1)).get("embeddings")
+        else:
+            # the export carries the collection metadata; Chroma stays closed
+            step("embedder", lambda: check_collection(index, get_embedder()))
+            embeddings = index.embeddings[:1]
+        step("page_index", tenant.page_index)
+        step("bm25", lambda: lexical_search(tenant, "warmup"))
+        if embeddings is not None and len(embeddings):
+            step("retrieval", lambda: retrieve(tenant, list(embeddings[0]), top_k=1))
+    except Exception as e:
+        _ready_state.update(ready=False, error=f"{type(e).__name__}: {e}", timings=timings)
+        raise
+    _ready_state.update(ready=True, error=None, timings=timings)
+    return timings
+
+
+def skip_warmup():
+    """
+    Report ready without warming up (RAG_WARMUP=0): resources are then
+    built lazily by the first requests.
+    """
+    _ready_state.update(ready=True, error=None, timings={})
+
+
+def readiness() -> dict:
+    """
+    {"ready": bool, "error": str | None, "timings": {...}} of the last warmup.
+    """
+    return dict(_ready_state)
+
+
+# ─── Async path (used by the FastAPI /chat route) ─────────────────────
+# One flow for every entry point. Chroma and page-index work is blocking,
+# so it runs on a bounded pool while OpenAI calls go through the pooled
+# AsyncOpenAI client; run_rag() drives the same flow synchronously.
+RAG_THREAD_WORKERS = int(os.getenv("RAG_THREAD_WORKERS", "8"))
+_executor = ThreadPoolExecutor(max_workers=RAG_THREAD_WORKERS, thread_name_prefix="rag")
+
+
+async def _in_thread(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+async def _inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+async def aget_query_embedding(text: str) -> list[float]:
+    key = normalize_query(text)
+    emb = _embedding_cache.get(key)
+    if emb is not None:
+        return emb
+
+    with stage("embedding"):
+        if EMBED_BATCHING:
+            emb = await asyncio.wrap_future(_embedding_batcher.submit(text))
+        else:
+            embedder = get_query_embedder()
+            if hasattr(embedder, "aembed"):
+                emb = (await embedder.aembed([text]))[0]
+            else:
+                emb = (await _in_thread(embedder.embed, [text]))[0]
+    _embedding_cache.set(key, emb)
+    return emb
+
+
+def _whole(answer: RagAnswer):
+    # events of an answer that is known in full before it is sent
+    return [("mode", answer.mode), ("sources", answer.sources), ("token", answer.answer)]
+
+
+async def stream_rag_async(query: str, tenant: TenantContext | None = None, top_k: int = RAG_TOP_K,
+                           conversation: Conversation | None = None, *,
+                           stream: bool = True, blocking: bool = False):
+    """
+    The RAG flow as a stream of events: ("mode", mode) and
+    ("sources", [page_id, ...]) once retrieval is done, then
+    ("token", delta) as the answer arrives. Direct, cached and extractive
+    answers arrive as a single token, and so does an LLM answer when
+    stream=False (a plain, hedgeable completion).
+
+    blocking=True runs every step on the calling thread with the sync
+    clients; it is only meant for run_rag().
+    """
+    if tenant is None:
+        with TENANTS.lease(COMPANY) as tenant:
+            async for event in stream_rag_async(query, tenant, top_k, conversation,
+                                                stream=stream, blocking=blocking):
+                yield event
+        return
+
+    run     = _inline if blocking else _in_thread
+    # the semantic cache is shared by the whole tenant, so it only holds
+    # (and serves) answers to prompts without a session's history
+    history = conversation is not None and not conversation.is_empty()
+
+    # 1) try direct JSON lookup (with exact N-day matching)
+    with stage("direct_lookup"):
+        direct = await run(direct_json_lookup, query, tenant, conversation)
+    if direct:
+        ANSWERS.labels("direct").inc()
+        for event in _whole(RagAnswer(*direct, "direct")):
+            yield event
+        return
+
+    # 2) confident keyword match → retrieve without an embedding call
+    lexical_hits, confident = await run(lexical_search, tenant, query, top_k)
+    follow_up = None
+    if not confident:
+        follow_up = await run(session_hits, tenant, query, conversation, top_k,
+                              (lexical_hits, confident))
+    q_emb = None
+    if confident:
+        hits = lexical_hits[:top_k]
+    elif follow_up:
+        # 3a) follow-up → the previous turn's pages, no embedding call
+        hits = follow_up
+    else:
+        # 3) hybrid vector + BM25, unless a similar question was answered
+        q_emb  = get_query_embedding(query) if blocking else await aget_query_embedding(query)
+        cached = None if history else await run(tenant.cached_answer, q_emb)
+        if cached:
+            ANSWERS.labels("cache").inc()
+            for event in _whole(RagAnswer(*cached, "cache")):
+                yield event
+            return
+        hits = await run(hybrid_retrieve, tenant, q_emb, lexical_hits, top_k)
+
+    # 4) a span of the chunks that answers the question outright
+    extracted = await run(extractive_answer, query, hits, follow_up)
+    if extracted:
+        for event in _whole(extracted):
+            yield event
+        return
+
+    # 5) LLM over the packed chunks
+    docs, sources = await run(pack_hits, hits)
+    messages = build_messages(query, docs, conversation)
+    yield "mode", "llm"
+    yield "sources", sources
+    started = time.perf_counter()
+    if stream:
+        parts = []
+        async for delta in astream_llm(messages=messages, max_tokens=150):
+            if not parts:
+                metrics.STAGE_LATENCY.labels("llm_first_token").observe(time.perf_counter() - started)
+            parts.append(delta)
+            yield "token", delta
+        answer = "".join(parts).strip()
+    else:
+        if blocking:
+            answer = call_llm(messages=messages, max_tokens=150)
+        else:
+            answer = await acall_llm(messages=messages, max_tokens=150)
+        yield "token", answer
+    metrics.STAGE_LATENCY.labels("llm").observe(time.perf_counter() - started)
+    ANSWERS.labels(_path(confident, follow_up)).inc()
+    if q_emb is not None and not history:
+        tenant.answer_cache.store(q_emb, answer, sources)
+
+
+async def _collect(events) -> RagAnswer:
+    mode, sources, parts = None, [], []
+    async for kind, payload in events:
+        if kind == "mode":
+            mode = payload
+        elif kind == "sources":
+            sources = payload
+        else:
+            parts.append(payload)
+    return RagAnswer("".join(parts), sources, mode)
+
+
+async def run_rag_async(query: str, tenant: TenantContext | None = None, top_k: int = RAG_TOP_K,
+                        conversation: Conversation | None = None):
+    """
+    Same flow as run_rag(), without blocking the event loop: the events
+    of stream_rag_async() collected into a RagAnswer.
+    """
+    return await _collect(stream_rag_async(query, tenant, top_k, conversation, stream=False))
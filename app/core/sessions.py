@@ -0,0 +1,190 @@
+# app/core/sessions.py
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, NamedTuple
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_SENTENCE   = re.compile(r"(?<=[.!?])\s+")
+
+
+class Conversation(NamedTuple):
+    """
+    What run_rag sees of a session: the rolling summary, the last few
+    (question, answer) turns and the page/section the last answer used.
+    """
+    summary: str
+    turns: list
+    page_ids: list
+    section: str | None
+
+    def is_empty(self) -> bool:
+        return not (self.summary or self.turns or self.page_ids)
+
+
+def fold_turn(summary: str, question: str, answer: str, max_chars: int) -> str:
+    """
+    Default summarizer: append one line per turn (question plus the first
+    sentence of the answer) and drop the oldest lines past `max_chars`.
+    """
+    first = _SENTENCE.split(answer.strip(), 1)[0]
+    line  = f"- Asked: {' '.join(question.split())[:160]} → {first[:200]}"
+    lines = [l for l in summary.splitlines() if l] + [line]
+    while len(lines) > 1 and sum(len(l) + 1 for l in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)[-max_chars:]
+
+
+class Session:
+    def __init__(self, key: tuple, keep_turns: int):
+        self.key       = key
+        self.summary   = ""
+        self.turns     = deque(maxlen=keep_turns)   # (question, answer)
+        self.page_ids: list[str] = []
+        self.section   = None
+        self.last_seen = time.monotonic()
+
+    @property
+    def session_id(self) -> str:
+        return self.key[1]
+
+    def size(self) -> int:
+        return (
+            len(self.summary)
+            + sum(len(q) + len(a) for q, a in self.turns)
+            + sum(len(p) for p in self.page_ids)
+            + 200   # bookkeeping
+        )
+
+    def context(self) -> Conversation:
+        return Conversation(self.summary, list(self.turns), list(self.page_ids), self.section)
+
+
+class SessionStore:
+    """
+    Server-side chat sessions keyed by (tenant_id, session_id).
+
+    Each session keeps the last `keep_turns` turns verbatim; older turns
+    are folded into a summary of at most `summary_chars` characters by
+    `summarize(summary, question, answer, max_chars)`. Sessions idle for
+    `idle_ttl` seconds are dropped, and the least recently used ones are
+    evicted once there are more than `max_sessions` or their estimated
+    size exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 1800.0,
+        keep_turns: int = 3,
+        summary_chars: int = 600,
+        summarize: Callable[[str, str, str, int], str] = fold_turn,
+    ):
+        self.max_sessions  = max_sessions
+        self.max_bytes     = max_bytes
+        self.idle_ttl      = idle_ttl
+        self.keep_turns    = keep_turns
+        self.summary_chars = summary_chars
+        self.summarize     = summarize
+        self._sessions: OrderedDict[tuple, Session] = OrderedDict()
+        self._bytes        = 0
+        self._lock         = threading.Lock()
+        self._swept_at     = time.monotonic()
+        self.evictions     = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def valid_id(session_id: str | None) -> bool:
+        return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+    def get(self, tenant_id: str, session_id: str) -> Conversation | None:
+        """
+        Snapshot of a live session, or None if unknown or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            session = self._sessions.get((tenant_id, session_id))
+            if session is None:
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session.key)
+            return session.context()
+
+    def record(self, tenant_id: str, session_id: str, question: str, answer: str,
+               page_ids: list[str], section: str | None = None):
+        """
+        Append a turn. A turn pushed out of the verbatim window is folded
+        into the summary (outside the lock, as the summarizer may call the
+        LLM).
+        """
+        key = (tenant_id, session_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = Session(key, self.keep_turns)
+            else:
+                self._bytes -= session.size()
+            folded = session.turns[0] if len(session.turns) == session.turns.maxlen else None
+            session.turns.append((question, answer))
+            if page_ids:
+                session.page_ids = list(dict.fromkeys(page_ids))
+            if section is not None:
+                session.section = section
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(key)
+            self._bytes += session.size()
+            summary = session.summary
+
+        if folded is not None:
+            summary = self.summarize(summary, folded[0], folded[1], self.summary_chars)
+            with self._lock:
+                if self._sessions.get(key) is session:
+                    self._bytes += len(summary) - len(session.summary)
+                    session.summary = summary
+
+        with self._lock:
+            self._evict()
+
+    def drop(self, tenant_id: str, session_id: str):
+        with self._lock:
+            session = self._sessions.pop((tenant_id, session_id), None)
+            if session is not None:
+                self._bytes -= session.size()
+
+    def _sweep(self, now: float):
+        # idle sessions sit at the front (LRU order); sweep at most every 10 s
+        if now - self._swept_at < 10:
+            return
+        self._swept_at = now
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= session.size()
+            self.evictions += 1
+
+    def _evict(self):
+        self._sweep(time.monotonic())
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            _, session = self._sessions.popitem(last=False)
+            self._bytes -= session.size()
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions":  len(self._sessions),
+                "bytes":     self._bytes,
+                "evictions": self.evictions,
+            }
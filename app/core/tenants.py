@@ -0,0 +1,338 @@
+# app/core/tenants.py
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from chromadb import PersistentClient
+
+from app.core.bm25 import BM25Index
+from app.core.cache import SemanticCache, PathWatcher
+from app.core.page_index import PageIndex
+from app.ingestion.numpy_index import NumpyIndex
+
+logger = logging.getLogger(__name__)
+
+# Tenant ids double as directory names, so keep them to a safe slug
+_TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+
+class TenantNotFound(LookupError):
+    pass
+
+
+class TenantClosed(RuntimeError):
+    pass
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    tenant_id = (tenant_id or "").strip().lower()
+    if not _TENANT_ID.match(tenant_id):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    return tenant_id
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class TenantContext:
+    """
+    Everything the RAG pipeline needs for one tour operator: its Chroma
+    collection (and optional numpy export), page index, BM25 index and
+    semantic answer cache. Each resource is created on first use.
+
+    Requests hold a lease (acquire / release) while they use the context;
+    once the registry retires it, it is closed when the last lease is
+    released, and it never reopens its resources after that.
+    """
+
+    def __init__(
+        self,
+        tenant_id: str,
+        db_path: Path,
+        processed_dir: Path,
+        backend: str = "chroma",
+        numpy_index_path: Path | None = None,
+        page_check_interval: float = 5.0,
+        vectorstore_check_interval: float = 5.0,
+        answer_cache_size: int = 512,
+        answer_cache_threshold: float = 0.95,
+        answer_cache_ttl: float = 86400.0,
+    ):
+        self.tenant_id        = tenant_id
+        self.db_path          = Path(db_path)
+        self.processed_dir    = Path(processed_dir)
+        self.backend          = backend
+        self.numpy_index_path = Path(numpy_index_path or self.db_path.parent / "numpy_index")
+        self.page_check_interval = page_check_interval
+        self._lock            = threading.RLock()
+        self._client          = None
+        self._collection      = None
+        self._numpy_index     = None
+        self._numpy_watcher   = None
+        self._numpy_version   = 0   # bumped on every (re)load of the export
+        self._answers_version = 0   # export version the answer cache was filled from
+        self._page_index      = None
+        self._bm25_index      = None
+        self._bm25_version    = -1
+        self._users           = 0
+        self._retired         = False
+        self._closed          = False
+        self._users_lock      = threading.Lock()
+        self.answer_cache     = SemanticCache(
+            maxsize=answer_cache_size, threshold=answer_cache_threshold, ttl=answer_cache_ttl,
+        )
+        # only chroma.sqlite3 is watched (the HNSW files are rewritten by
+        # queries), and only once the store is open (opening rewrites it);
+        # the "numpy" backend follows reloads of its export instead
+        self._vectorstore_watcher = None
+        self.vectorstore_check_interval = vectorstore_check_interval
+        # rough resident size (HNSW segments are loaded into memory)
+        self.size_bytes = _dir_size(self.db_path) + _dir_size(self.processed_dir)
+
+    def __repr__(self):
+        return f"TenantContext({self.tenant_id!r})"
+
+    # ─── Leases ──────────────────────────────────────────────────────────
+    def acquire(self) -> "TenantContext":
+        with self._users_lock:
+            if self._retired:
+                raise TenantClosed(self.tenant_id)
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            last = self._retired and self._users == 0
+        if last:
+            self.close()
+
+    def retire(self):
+        """
+        Close now if no request holds a lease, else when the last one is
+        released.
+        """
+        with self._users_lock:
+            self._retired = True
+            idle = self._users == 0
+        if idle:
+            self.close()
+
+    # ─── Lazily opened resources ────────────────────────────────────────
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._closed:
+                    raise TenantClosed(self.tenant_id)
+                if self._collection is None:
+                    self._client     = PersistentClient(path=str(self.db_path))
+                    self._collection = self._client.get_or_create_collection(name="docs")
+                    self._vectorstore_watcher = PathWatcher(
+                        self.db_path / "chroma.sqlite3", check_interval=self.vectorstore_check_interval,
+                    )
+        return self._collection
+
+    def numpy_index(self) -> NumpyIndex | None:
+        """
+        The memory-mapped export of the collection when the backend is
+        "numpy" (reloaded when the export is rewritten), else None.
+        """
+        if self.backend != "numpy":
+            return None
+        if self._numpy_index is None:
+            with self._lock:
+                if self._closed:
+                    raise TenantClosed(self.tenant_id)
+                if self._numpy_index is None:
+                    # snapshot first so an export landing during the load is seen
+                    watcher = PathWatcher(self.numpy_index_path)
+                    if NumpyIndex.exists(self.numpy_index_path):
+                        index = NumpyIndex(self.numpy_index_path)
+                    else:
+                        # Chroma is only opened when there is nothing to map
+                        index = NumpyIndex.export(self.collection(), self.numpy_index_path)
+                    self._numpy_watcher  = watcher
+                    self._numpy_index    = index
+                    self._numpy_version += 1
+        elif self._numpy_watcher.changed():
+            try:
+                self._numpy_index    = NumpyIndex(self.numpy_index_path)
+                self._numpy_version += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"Keeping the loaded numpy index for {self.tenant_id}: {e}")
+                self._numpy_watcher.invalidate()
+        return self._numpy_index
+
+    def page_index(self) -> PageIndex:
+        if self._page_index is None:
+            with self._lock:
+                if self._closed:
+                    raise TenantClosed(self.tenant_id)
+                if self._page_index is None:
+                    self._page_index = PageIndex(self.processed_dir, check_interval=self.page_check_interval)
+        return self._page_index
+
+    def lexical_index(self) -> BM25Index:
+        """
+        BM25 over the tenant's chunks, rebuilt whenever the page index reloads.
+        """
+        page_index = self.page_index()
+        page_index.refresh()
+        if self._bm25_version != page_index.version:
+            version            = page_index.version
+            self._bm25_index   = BM25Index.from_pages(page_index.pages)
+            self._bm25_version = version
+        return self._bm25_index
+
+    def cached_answer(self, q_emb: list[float]):
+        """
+        (answer, sources) of a semantically equivalent earlier question,
+        if any; the cache is dropped whenever the vectorstore changes.
+        """
+        if self._store_changed():
+            self.answer_cache.clear()
+        return self.answer_cache.lookup(q_emb)
+
+    def _store_changed(self) -> bool:
+        if self.backend == "numpy":
+            self.numpy_index()
+            seen, self._answers_version = self._answers_version, self._numpy_version
+            return seen != self._numpy_version
+        self.collection()
+        return self._vectorstore_watcher.changed()
+
+    def close(self):
+        """
+        Release the Chroma handle and in-memory indexes.
+        """
+        with self._lock:
+            self._closed = True
+            close = getattr(self._client, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"Closing Chroma client for {self.tenant_id} failed: {e}")
+            self._client = self._collection = None
+            self._numpy_index = self._page_index = self._bm25_index = None
+            self.answer_cache.clear()
+
+
+class TenantRegistry:
+    """
+    Resolves tenant ids to TenantContexts. Tenant `t` lives in
+    `{vectorstore_root}/t/chroma.sqlite3` and `{processed_root}/t`; a
+    tenant is known once either directory exists.
+
+    Open contexts are kept in LRU order and the least recently used ones
+    are retired when more than `max_open` are open or their combined
+    on-disk size exceeds `max_bytes` (the most recent one always stays).
+    A retired context is closed once no lease() on it is left.
+    """
+
+    def __init__(
+        self,
+        vectorstore_root: Path,
+        processed_root: Path,
+        max_open: int = 16,
+        max_bytes: int = 1 << 30,
+        overrides: dict | None = None,
+        **context_kwargs,
+    ):
+        self.vectorstore_root = Path(vectorstore_root)
+        self.processed_root   = Path(processed_root)
+        self.max_open         = max_open
+        self.max_bytes        = max_bytes
+        self.overrides        = overrides or {}   # tenant_id → {"db_path", "processed_dir", "numpy_index_path"}
+        self.context_kwargs   = context_kwargs
+        self._open: OrderedDict[str, TenantContext] = OrderedDict()
+        self._lock            = threading.Lock()
+        self.evictions        = 0
+
+    def paths(self, tenant_id: str) -> tuple[Path, Path]:
+        override = self.overrides.get(tenant_id, {})
+        return (
+            Path(override.get("db_path") or self.vectorstore_root / tenant_id / "chroma.sqlite3"),
+            Path(override.get("processed_dir") or self.processed_root / tenant_id),
+        )
+
+    def exists(self, tenant_id: str) -> bool:
+        db_path, processed_dir = self.paths(tenant_id)
+        return tenant_id in self.overrides or db_path.exists() or processed_dir.exists()
+
+    def get(self, tenant_id: str, acquire: bool = False) -> TenantContext:
+        """
+        The open context of `tenant_id`, created on first use. With
+        acquire=True a lease is taken before the context can be retired;
+        the caller must release() it.
+        """
+        tenant_id = validate_tenant_id(tenant_id)
+        with self._lock:
+            ctx = self._open.get(tenant_id)
+            if ctx is not None:
+                self._open.move_to_end(tenant_id)
+                return ctx.acquire() if acquire else ctx
+        if not self.exists(tenant_id):
+            raise TenantNotFound(tenant_id)
+
+        db_path, processed_dir = self.paths(tenant_id)
+        kwargs = dict(self.context_kwargs)
+        if self.overrides.get(tenant_id, {}).get("numpy_index_path"):
+            kwargs["numpy_index_path"] = Path(self.overrides[tenant_id]["numpy_index_path"])
+        fresh = TenantContext(tenant_id, db_path, processed_dir, **kwargs)
+        with self._lock:
+            ctx = self._open.setdefault(tenant_id, fresh)   # another thread may have won
+            self._open.move_to_end(tenant_id)
+            if acquire:
+                ctx.acquire()
+            evicted = self._evict()
+        for old in evicted:
+            logger.info(f"Retiring tenant {old.tenant_id} (LRU)")
+            old.retire()
+        return ctx
+
+    @contextmanager
+    def lease(self, tenant_id: str):
+        """
+        Context of `tenant_id`, kept open until the block exits.
+        """
+        ctx = self.get(tenant_id, acquire=True)
+        try:
+            yield ctx
+        finally:
+            ctx.release()
+
+    def _evict(self) -> list[TenantContext]:
+        evicted = []
+        total   = sum(c.size_bytes for c in self._open.values())
+        while len(self._open) > 1 and (len(self._open) > self.max_open or total > self.max_bytes):
+            _, ctx = self._open.popitem(last=False)
+            total -= ctx.size_bytes
+            evicted.append(ctx)
+        self.evictions += len(evicted)
+        return evicted
+
+    def open_contexts(self) -> list[TenantContext]:
+        with self._lock:
+            return list(self._open.values())
+
+    def stats(self) -> dict:
+        contexts = self.open_contexts()
+        return {
+            "open":       len(contexts),
+            "open_bytes": sum(c.size_bytes for c in contexts),
+            "evictions":  self.evictions,
+        }
@@ -1,12 +1,282 @@
+# app/ingestion/embedder.py
+
+import asyncio
+import hashlib
+import logging
 import os
-import openai
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.ingestion.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+EMBEDDING_BACKEND      = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+EMBEDDING_MODEL_PATH   = os.getenv("EMBEDDING_MODEL_PATH")           # sentence-transformers model dir
+EMBEDDING_DIM          = int(os.getenv("EMBEDDING_DIM", "512"))      # hashing backend only
+EMBEDDING_BATCH_SIZE   = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_STORE        = os.getenv("EMBEDDING_STORE", "1") not in ("0", "false", "no")
+EMBEDDING_STORE_PATH   = os.getenv("EMBEDDING_STORE_PATH", ".cache/embeddings.sqlite3")
+EMBEDDING_STORE_MAX_MB = float(os.getenv("EMBEDDING_STORE_MAX_MB", "1024"))
+
+# Collection metadata keys describing how its vectors were made
+META_BACKEND = "embedding_backend"
+META_MODEL   = "embedding_model"
+META_DIM     = "embedding_dim"
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into vectors, a batch at a time. `dim` may be None until
+    the first call for providers that only learn it from the model.
+    """
+    backend = "base"
+    model   = ""
+    dim: int | None = None
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+    def embed_one(self, text: str) -> list[float]:
+        return self.embed([text])[0]
+
+    def metadata(self) -> dict:
+        """
+        Collection metadata recording backend, model and dimension.
+        """
+        if self.dim is None:
+            self.embed_one("dimension probe")
+        return {META_BACKEND: self.backend, META_MODEL: self.model, META_DIM: self.dim}
+
+
+class OpenAIEmbedder(EmbeddingProvider):
+    backend = "openai"
+    _DIMS = {
+        "text-embedding-ada-002": 1536,
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+    }
+
+    def __init__(self, model: str | None = None):
+        from app.core.llm_client import EMBEDDING_MODEL
+        self.model = model or EMBEDDING_MODEL
+        self.dim   = self._DIMS.get(self.model)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        from app.core.llm_client import get_client
+        vectors = get_client().embed(texts, model=self.model)
+        if vectors and self.dim is None:
+            self.dim = len(vectors[0])
+        return vectors
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        from app.core.llm_client import get_client
+        vectors = await get_client().aembed(texts, model=self.model)
+        if vectors and self.dim is None:
+            self.dim = len(vectors[0])
+        return vectors
+
+
+class SentenceTransformerEmbedder(EmbeddingProvider):
+    """
+    Local CPU model (sentence-transformers, loaded from a local path or
+    cache so no network is needed at run time).
+    """
+    backend = "sentence-transformers"
+
+    def __init__(self, model_path: str, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+        self.model      = os.path.basename(os.path.normpath(model_path))
+        self.batch_size = batch_size
+        self._model     = SentenceTransformer(model_path, device="cpu")
+        self.dim        = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False,
+        )
+        return vectors.astype(np.float32).tolist()
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dim: int) -> tuple[int, float]:
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, (1.0 if h >> 63 else -1.0)
+
+
+class HashingEmbedder(EmbeddingProvider):
+    """
+    Dependency-free fallback: signed feature hashing of word unigrams and
+    bigrams into `dim` buckets, L2-normalized. Deterministic across runs
+    and machines, so indexes built offline can be served offline.
+    """
+    backend = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim   = dim
+        self.model = f"hashing-{dim}"
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                j, sign = _bucket(feature, self.dim)
+                out[i, j] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).tolist()
+
+
+class StoredEmbedder(EmbeddingProvider):
+    """
+    Wraps a provider with the persistent EmbeddingStore: one batched
+    lookup per call, and only the texts never seen before (for this
+    backend and model) reach the wrapped provider.
+    """
+
+    def __init__(self, inner: EmbeddingProvider, store: EmbeddingStore):
+        self.inner = inner
+        self.store = store
+
+    backend = property(lambda self: self.inner.backend)
+    model   = property(lambda self: self.inner.model)
+    dim     = property(lambda self: self.inner.dim)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        key     = f"{self.inner.backend}/{self.inner.model}"
+        vectors = self.store.get_many(key, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self.inner.embed(missing)))
+            self.store.put_many(key, missing, [fresh[t] for t in missing])
+            vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Async `embed`: the store is read and written in a worker thread and
+        the misses go to the wrapped provider's `aembed` when it has one.
+        """
+        key     = f"{self.inner.backend}/{self.inner.model}"
+        vectors = await asyncio.to_thread(self.store.get_many, key, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            if hasattr(self.inner, "aembed"):
+                embedded = await self.inner.aembed(missing)
+            else:
+                embedded = await asyncio.to_thread(self.inner.embed, missing)
+            fresh = dict(zip(missing, embedded))
+            await asyncio.to_thread(self.store.put_many, key, missing, [fresh[t] for t in missing])
+            vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def metadata(self) -> dict:
+        return self.inner.metadata()
+
+
+def make_embedder(backend: str | None = None) -> EmbeddingProvider:
+    """
+    Build the provider named by `backend` (default EMBEDDING_BACKEND):
+    "openai", "sentence-transformers", "hashing", or "local" (the
+    sentence-transformers model at EMBEDDING_MODEL_PATH if available,
+    else hashing).
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "openai":
+        return OpenAIEmbedder()
+    if backend == "hashing":
+        return HashingEmbedder(EMBEDDING_DIM)
+    if backend in ("sentence-transformers", "local"):
+        if EMBEDDING_MODEL_PATH:
+            try:
+                return SentenceTransformerEmbedder(EMBEDDING_MODEL_PATH, EMBEDDING_BATCH_SIZE)
+            except ImportError:
+                if backend != "local":
+                    raise RuntimeError("EMBEDDING_BACKEND=sentence-transformers needs the "
+                                       "sentence-transformers package")
+                logger.warning("sentence-transformers not installed; using hashing embeddings")
+        elif backend != "local":
+            raise RuntimeError("Please set EMBEDDING_MODEL_PATH for the sentence-transformers backend")
+        return HashingEmbedder(EMBEDDING_DIM)
+    raise RuntimeError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+
+_embedder = None
+_store    = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> EmbeddingProvider:
+    """
+    Process-wide provider configured from the environment, behind the
+    persistent embedding store unless EMBEDDING_STORE=0 (hashing is
+    cheaper to recompute than to look up, so it is never stored).
+    """
+    global _embedder, _store
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                embedder = make_embedder()
+                if EMBEDDING_STORE and not isinstance(embedder, HashingEmbedder):
+                    try:
+                        _store   = EmbeddingStore(EMBEDDING_STORE_PATH,
+                                                  int(EMBEDDING_STORE_MAX_MB * 1024 * 1024))
+                        embedder = StoredEmbedder(embedder, _store)
+                    except (OSError, sqlite3.Error) as e:
+                        logger.warning(f"Embedding store disabled ({EMBEDDING_STORE_PATH}): {e}")
+                _embedder = embedder
+    return _embedder
+
+
+def get_query_embedder() -> EmbeddingProvider:
+    """
+    The provider for user queries: get_embedder() without the persistent
+    store, so serving never writes to it (repeated queries are served by
+    the pipeline's in-memory query cache instead).
+    """
+    embedder = get_embedder()
+    return embedder.inner if isinstance(embedder, StoredEmbedder) else embedder
+
+
+def embedding_store_stats() -> dict:
+    return _store.stats() if _store is not None else {}
+
+
+def check_collection(collection, embedder: EmbeddingProvider):
+    """
+    Raise if the collection was built with a different embedding backend,
+    model or dimension than `embedder` (collections without the metadata
+    predate it and are accepted).
+    """
+    meta = collection.metadata or {}
+    if META_DIM not in meta:
+        return
+    expected = embedder.metadata()
+    mismatched = [k for k in (META_BACKEND, META_MODEL, META_DIM) if meta.get(k) != expected[k]]
+    if mismatched:
+        raise RuntimeError(
+            f"Collection '{collection.name}' was built with "
+            f"{meta.get(META_BACKEND)}/{meta.get(META_MODEL)} ({meta.get(META_DIM)} dims) "
+            f"but the configured embedder is {expected[META_BACKEND]}/{expected[META_MODEL]} "
+            f"({expected[META_DIM]} dims); rebuild the vectorstore or change EMBEDDING_BACKEND"
+        )
 
-# Read the API key at runtime
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def get_embedding(text: str, model: str="text-embedding-ada-002") -> list[float]:
+def get_embedding(text: str) -> list[float]:
     """
-    Call OpenAI's embedding endpoint for any text.
+    Embed a single text with the configured provider.
     """
-    resp = openai.Embedding.create(model=model, input=text)
-    return resp["data"][0]["embedding"] 
\ No newline at end of file
+    return get_embedder().embed_one(text)
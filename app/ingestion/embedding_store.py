@@ -0,0 +1,132 @@
+# app/ingestion/embedding_store.py
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model   TEXT NOT NULL,
+    hash    TEXT NOT NULL,
+    vector  BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (model, hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created);
+"""
+
+# SQLite's default limit on host parameters per statement is 999
+_LOOKUP_CHUNK = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Content-addressed embeddings on disk: (model, sha256(text)) → float32
+    vector, in SQLite (WAL mode, so the pipeline scripts and API workers
+    can share one file). Shared by every tenant and every pipeline entry
+    point, so a text is embedded once per model. Past `max_bytes` the
+    oldest entries are deleted down to 90% of it.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 1 << 30):
+        self.path      = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local    = threading.local()   # one connection per thread
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            self._bytes = conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """
+        Stored vectors for `texts` (None where missing), in input order.
+        """
+        hashes = [text_hash(t) for t in texts]
+        found: dict[str, list[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        try:
+            conn = self._conn()
+            for i in range(0, len(unique), _LOOKUP_CHUNK):
+                part = unique[i:i + _LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? "
+                    f"AND hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store read failed: {e}")
+        out = [found.get(h) for h in hashes]
+        with self._lock:
+            hits = sum(v is not None for v in out)
+            self.hits   += hits
+            self.misses += len(out) - hits
+        return out
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        now  = time.time()
+        rows = [
+            (model, text_hash(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        try:
+            # a key is content-addressed, so an existing row already holds
+            # this vector; only new rows add to the byte count
+            added = 0
+            with self._conn() as conn:
+                for row in rows:
+                    if conn.execute("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", row).rowcount:
+                        added += len(row[2])
+            with self._lock:
+                self._bytes += added
+                over = self._bytes > self.max_bytes
+            if over:
+                self._evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store write failed: {e}")
+
+    def _evict(self):
+        with self._conn() as conn:
+            total  = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+            target = int(self.max_bytes * 0.9)
+            freed  = 0
+            if total > self.max_bytes:
+                for model, h, size in conn.execute(
+                    "SELECT model, hash, LENGTH(vector) FROM embeddings ORDER BY created"
+                ).fetchall():
+                    if total - freed <= target:
+                        break
+                    conn.execute("DELETE FROM embeddings WHERE model = ? AND hash = ?", (model, h))
+                    freed += size
+        with self._lock:
+            self._bytes = total - freed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._bytes}
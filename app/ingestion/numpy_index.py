@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE        = "ids.json"
+DOCUMENTS_FILE  = "documents.json"
+METADATAS_FILE  = "metadatas.json"
+COLLECTION_FILE = "collection.json"   # name + metadata of the exported collection
+CURRENT_FILE    = "CURRENT"           # name of the live export generation
+
+
+class NumpyIndex:
+    """
+    In-process retrieval backend: the whole collection as one contiguous,
+    L2-normalized float32 matrix (memory-mapped) plus parallel id /
+    document / metadata arrays. Top-k is one dot product + argpartition.
+
+    Each export is written to its own generation directory under
+    `index_dir` and published by replacing the CURRENT pointer, so a
+    reader never mixes files of two exports.
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir  = Path(index_dir)
+        data_dir        = self._data_dir(self.index_dir)
+        self.embeddings = np.load(data_dir / EMBEDDINGS_FILE, mmap_mode="r")
+        self.ids        = json.loads((data_dir / IDS_FILE).read_text(encoding="utf-8"))
+        self.documents  = json.loads((data_dir / DOCUMENTS_FILE).read_text(encoding="utf-8"))
+        self.metadatas  = json.loads((data_dir / METADATAS_FILE).read_text(encoding="utf-8"))
+        if not (len(self.ids) == len(self.documents) == len(self.metadatas) == len(self.embeddings)):
+            raise ValueError(f"Inconsistent numpy index in {data_dir}")
+        # lets check_collection() validate the embedder without opening Chroma
+        collection    = data_dir / COLLECTION_FILE
+        info          = json.loads(collection.read_text(encoding="utf-8")) if collection.exists() else {}
+        self.name     = info.get("name", "docs")
+        self.metadata = info.get("metadata") or {}
+
+    @staticmethod
+    def _data_dir(index_dir: Path) -> Path:
+        try:
+            return index_dir / (index_dir / CURRENT_FILE).read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return index_dir   # flat layout of exports that predate generations
+
+    @classmethod
+    def exists(cls, index_dir: Path) -> bool:
+        data_dir = cls._data_dir(Path(index_dir))
+        return all((data_dir / f).exists()
+                   for f in (EMBEDDINGS_FILE, IDS_FILE, DOCUMENTS_FILE, METADATAS_FILE))
+
+    @classmethod
+    def export(cls, collection, index_dir: Path, batch_size: int = 1000) -> "NumpyIndex":
+        """
+        Dump a Chroma collection to a new generation under `index_dir`,
+        publish it and return the loaded index. The previous generation is
+        kept until the next export, for readers that already resolved it.
+        """
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+
+        ids, docs, metas, vecs = [], [], [], []
+        offset = 0
+        while True:
+            res = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset,
+            )
+            if not res["ids"]:
+                break
+            ids.extend(res["ids"])
+            docs.extend(res["documents"])
+            metas.extend(res["metadatas"])
+            vecs.extend(res["embeddings"])
+            offset += len(res["ids"])
+
+        matrix = np.asarray(vecs, dtype=np.float32)
+        if not ids:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = np.ascontiguousarray(matrix / norms)
+
+        previous   = cls._data_dir(index_dir)
+        generation = f"gen-{time.time_ns():x}"
+        data_dir   = index_dir / generation
+        data_dir.mkdir()
+        with open(data_dir / EMBEDDINGS_FILE, "wb") as f:
+            np.save(f, matrix)
+        info = {"name": collection.name, "metadata": collection.metadata or {}}
+        for name, payload in ((IDS_FILE, ids), (DOCUMENTS_FILE, docs),
+                              (METADATAS_FILE, metas), (COLLECTION_FILE, info)):
+            (data_dir / name).write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+        pointer = index_dir / f".{CURRENT_FILE}.tmp"
+        pointer.write_text(generation, encoding="utf-8")
+        os.replace(pointer, index_dir / CURRENT_FILE)
+        cls._prune(index_dir, keep={data_dir, previous})
+
+        logger.info(f"Exported {len(ids)} vectors ({matrix.shape[1] if ids else 0}-d) → {data_dir}")
+        return cls(index_dir)
+
+    @staticmethod
+    def _prune(index_dir: Path, keep: set):
+        """
+        Remove generations (and flat-layout files) other than those in `keep`.
+        """
+        for entry in index_dir.iterdir():
+            if entry.is_dir() and entry.name.startswith("gen-") and entry not in keep:
+                shutil.rmtree(entry, ignore_errors=True)
+        if index_dir not in keep:
+            for name in (EMBEDDINGS_FILE, IDS_FILE, DOCUMENTS_FILE, METADATAS_FILE):
+                (index_dir / name).unlink(missing_ok=True)
+
+    @classmethod
+    def load_or_export(cls, collection, index_dir: Path) -> "NumpyIndex":
+        if cls.exists(index_dir):
+            return cls(index_dir)
+        return cls.export(collection, index_dir)
+
+    def search(self, query_emb: list[float], top_k: int = 3):
+        """
+        Return (ids, documents, metadatas, scores) of the top_k rows by
+        cosine similarity, best first.
+        """
+        n = len(self.ids)
+        if n == 0 or top_k <= 0:
+            return [], [], [], []
+        q = np.asarray(query_emb, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        scores = self.embeddings @ q
+        k = min(top_k, n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return (
+            [self.ids[i] for i in top],
+            [self.documents[i] for i in top],
+            [self.metadatas[i] for i in top],
+            [float(scores[i]) for i in top],
+        )
+
+    def query(self, query_emb: list[float], top_k: int = 3):
+        """
+        Same contract as VectorStore.query: returns (docs, metadatas).
+        """
+        _, docs, metas, _ = self.search(query_emb, top_k)
+        return docs, metas
+
+    def __len__(self):
+        return len(self.ids)
+
+
+if __name__ == "__main__":
+    # Export the configured collection: python -m app.ingestion.numpy_index
+    from chromadb import PersistentClient
+
+    company  = os.getenv("COMPANY_NAME", "my_company")
+    db_path  = os.getenv("VECTORSTORE_PATH", f"vectorstores/{company}/chroma.sqlite3")
+    out_dir  = os.getenv("NUMPY_INDEX_PATH", f"vectorstores/{company}/numpy_index")
+    coll     = PersistentClient(path=db_path).get_or_create_collection(name="docs")
+    index    = NumpyIndex.export(coll, Path(out_dir))
+    print(f"✅ Exported {len(index)} vectors to {out_dir}")
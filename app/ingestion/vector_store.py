@@ -1,15 +1,28 @@
 import os
 from chromadb import PersistentClient
 
+from app.ingestion.numpy_index import NumpyIndex
+
 class VectorStore:
     """
     Runtime wrapper around ChromaDB for upsert & query.
+
+    backend="numpy" answers queries from a memory-mapped NumpyIndex
+    exported from the same collection (re-exported after upserts).
     """
 
-    def __init__(self, db_path: str, collection_name: str="docs"):
+    def __init__(self, db_path: str, collection_name: str="docs",
+                 backend: str="chroma", index_dir: str | None=None):
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector store backend: {backend}")
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.client = PersistentClient(path=db_path)
         self.collection = self.client.get_or_create_collection(name=collection_name)
+        self.backend = backend
+        self.index_dir = index_dir or os.path.join(os.path.dirname(db_path), "numpy_index")
+        self.index = None
+        if backend == "numpy":
+            self.index = NumpyIndex.load_or_export(self.collection, self.index_dir)
 
     def upsert_chunk(self, chunk_id: str, embedding: list[float], text: str, metadata: dict):
         """
@@ -21,10 +34,16 @@ class VectorStore:
             documents=[text],
             metadatas=[metadata]
         )
+        if self.backend == "numpy":
+            self.index = None   # stale; re-exported on next query
 
     def query(self, query_emb: list[float], top_k: int=3):
         """
         Query the vector store and return (docs, metadatas).
         """
+        if self.backend == "numpy":
+            if self.index is None:
+                self.index = NumpyIndex.export(self.collection, self.index_dir)
+            return self.index.query(query_emb, top_k)
         res = self.collection.query(query_embeddings=[query_emb], n_results=top_k)
-        return res["documents"][0], res["metadatas"][0] 
\ No newline at end of file
+        return res["documents"][0], res["metadatas"][0]
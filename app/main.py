@@ -1,10 +1,14 @@
 # app/main.py
 
 import os
+import time
+import asyncio
+import logging
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from typing import Optional
@@ -14,6 +18,8 @@ load_dotenv()
 
 # ─── Import Chat Router (existing RAG endpoint) ──────────────────────────────────
 from app.api.chat import router as chat_router
+from app.core.rag_pipeline import warmup, readiness, skip_warmup
+from app.core import metrics
 
 # ─── Import MongoDB connection helper and booking service functions ──────────────
 from app.db.mongodb import connect_to_mongo  # must initialize MongoDB
@@ -24,6 +30,12 @@ from services.booking import (
 )
 
 
+logger = logging.getLogger(__name__)
+
+RAG_WARMUP       = os.getenv("RAG_WARMUP", "1") not in ("0", "false", "no")
+RAG_WARMUP_RETRY = float(os.getenv("RAG_WARMUP_RETRY", "10"))   # seconds between retries of a failed warmup
+
+
 # ─── FastAPI app instance ─────────────────────────────────────────────────────────
 app = FastAPI(
     title="Custom Chatbot + Booking Backend",
@@ -52,9 +64,32 @@ async def startup_event():
     """
     connect_to_mongo()
 
+    # Warm the RAG resources in the background so the worker can bind
+    # right away; /ready turns 200 once this has finished. Without warmup
+    # the worker is ready at once and the first requests build them.
+    if RAG_WARMUP:
+        _start_warmup()
+    else:
+        skip_warmup()
+
+
+def _start_warmup():
+    app.state.warmup_started = time.monotonic()
+    app.state.warmup_task    = asyncio.get_running_loop().run_in_executor(None, _warmup)
+
 
-# ─── Include existing chat routes under /chat ──────────────────────────────────────
+def _warmup():
+    try:
+        timings = warmup()
+        logger.info(f"RAG warmup done: {timings}")
+    except Exception as e:
+        logger.error(f"RAG warmup failed: {e}")
+
+
+# ─── Include chat routes under /chat ──────────────────────────────────────
 app.include_router(chat_router, prefix="/chat")
+# …and per tour operator (the X-Tenant-ID header works on /chat as well)
+app.include_router(chat_router, prefix="/tenants/{tenant_id}/chat")
 
 
 # ─── Booking Request Models ───────────────────────────────────────────────────────
@@ -127,6 +162,26 @@ async def health_check():
     return {"status": "ok", "message": "FastAPI service is running"}
 
 
+# ─── Readiness probe: RAG resources warmed up ──────────────────────────────────────
+@app.get("/ready")
+async def ready_check():
+    state = readiness()
+    # a failed warmup (e.g. the vectorstore was not there yet) is retried
+    # from the probe, at most every RAG_WARMUP_RETRY seconds
+    task = getattr(app.state, "warmup_task", None)
+    if (not state["ready"] and state["error"] and task is not None and task.done()
+            and time.monotonic() - app.state.warmup_started >= RAG_WARMUP_RETRY):
+        _start_warmup()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+
+# ─── Prometheus metrics ────────────────────────────────────────────────────────────
+@app.get("/metrics")
+async def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 # ─── Root redirect (optional) ──────────────────────────────────────────────────────
 @app.get("/")
 async def root():
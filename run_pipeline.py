@@ -2,7 +2,7 @@
 """
 run_pipeline.py
 
-Read clean URLs from scripts/urls.txt → Scrape HTML → Parse → Chunk → Validate → Build vectorstore.
+Read clean URLs from scripts/urls.txt → Scrape HTML → Parse → Chunk → Validate → Render direct answers → Build vectorstore.
 """
 
 import os
@@ -17,6 +17,7 @@ from services.data_ingestion.scraper     import WebScraper
 from services.data_ingestion.parser      import HtmlParser
 from services.data_ingestion.transformer import Transformer
 from services.data_ingestion.loader      import Loader
+from services.data_ingestion.answer_renderer import AnswerRenderer
 
 # Vectorstore builder entrypoint
 from services.vectorstore_builder.build_vectorstore import main as build_vectorstore
@@ -46,7 +47,10 @@ def main():
     raw_dir = root / "raw_data" / company
     raw_dir.mkdir(parents=True, exist_ok=True)
     print(f"🔍 Scraping HTML → {raw_dir}")
-    WebScraper(output_dir=raw_dir).scrape(urls)
+    report = WebScraper(output_dir=raw_dir).scrape(urls)
+    print(f"   {len(report.fetched)} fetched, {len(report.unchanged)} unchanged, {len(report.failed)} failed")
+    for url, error in report.failed.items():
+        print(f"   ⚠️  {url}: {error}")
 
     # ── 3. Parse HTML into structured JSON ─────────────────────────
     manifest_dir  = root / "data" / "webpages"        # <— new manifest_dir
@@ -67,7 +71,11 @@ def main():
     print("🔍 Validating structured JSON documents")
     Loader(processed_dir=processed_dir).validate_all()
 
-    # ── 6. Build the Chroma vectorstore ────────────────────────────
+    # ── 6. Pre-render direct answers for the chat fast path ────────
+    print("📝 Rendering direct (page, section) answers")
+    AnswerRenderer(processed_dir=processed_dir).render_all()
+
+    # ── 7. Build the Chroma vectorstore ────────────────────────────
     print("🛠  Building Chroma vectorstore")
     build_vectorstore()
 
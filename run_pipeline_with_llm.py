@@ -5,7 +5,8 @@ run_pipeline.py
 1) Read & sanitize URLs
 2) Scrape HTML
 3) Structure JSON via OpenAI LLM
-4) Build ChromaDB vectorstore from that JSON
+4) Pre-render direct answers
+5) Build ChromaDB vectorstore from that JSON
 """
 
 import os
@@ -19,6 +20,7 @@ load_dotenv()  # ensures OPENAI_API_KEY, COMPANY_NAME, VECTORSTORE_PATH, etc. ar
 from scripts.extract_urls import extract_urls
 from services.data_ingestion.scraper     import WebScraper
 from services.data_ingestion.llm_structurer import LLMStructurer
+from services.data_ingestion.answer_renderer import AnswerRenderer
 from services.vectorstore_builder.build_vectorstore import main as build_vectorstore
 
 def main():
@@ -37,7 +39,10 @@ def main():
     raw_dir = root / "raw_data" / company
     raw_dir.mkdir(parents=True, exist_ok=True)
     print(f"🔍 Scraping HTML into {raw_dir}")
-    WebScraper(output_dir=raw_dir).scrape(urls)
+    report = WebScraper(output_dir=raw_dir).scrape(urls)
+    print(f"   {len(report.fetched)} fetched, {len(report.unchanged)} unchanged, {len(report.failed)} failed")
+    for url, error in report.failed.items():
+        print(f"   ⚠️  {url}: {error}")
 
     # ── 3. LLM-based Structuring ────────────────────────────────────
     manifest_dir  = root / "data" / "webpages"
@@ -48,9 +53,18 @@ def main():
         raw_dir=raw_dir,
         processed_dir=processed_dir
     )
-    structurer.structure_all()
+    summary = structurer.structure_all()
+    print(f"   {summary['structured']} structured, {summary['skipped']} unchanged, "
+          f"{summary['stubbed']} stubbed, {summary['failed']} failed "
+          f"({summary['pages_per_sec']} pages/s)")
+    for page_id in summary["failed_pages"]:
+        print(f"   ⚠️  {page_id}")
 
-    # ── 4. Build ChromaDB Vectorstore ──────────────────────────────
+    # ── 4. Pre-render direct answers ────────────────────────────────
+    print("📝 Rendering direct (page, section) answers")
+    AnswerRenderer(processed_dir=processed_dir).render_all()
+
+    # ── 5. Build ChromaDB Vectorstore ──────────────────────────────
     print(f"🛠 Building ChromaDB vectorstore at {os.getenv('VECTORSTORE_PATH')}")
     build_vectorstore()
 
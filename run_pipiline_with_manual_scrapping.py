@@ -5,7 +5,8 @@ run_pipeline_with_manual_scraping.py
 Assumes your *_structured.json files live in processed_data/<COMPANY_NAME>/.
 1) Chunk them
 2) Validate them
-3) Build Chroma vectorstore
+3) Pre-render direct answers
+4) Build Chroma vectorstore
 """
 
 import os
@@ -16,6 +17,7 @@ load_dotenv()
 
 from services.data_ingestion.transformer import Transformer
 from services.data_ingestion.loader      import Loader
+from services.data_ingestion.answer_renderer import AnswerRenderer
 from services.vectorstore_builder.build_vectorstore import main as build_vectorstore
 
 def main():
@@ -34,6 +36,9 @@ def main():
     print("🔍 Validating structured JSON documents")
     Loader(processed_dir=processed_dir).validate_all()
 
+    print("📝 Rendering direct (page, section) answers")
+    AnswerRenderer(processed_dir=processed_dir).render_all()
+
     print("🛠  Building Chroma vectorstore")
     build_vectorstore()
 
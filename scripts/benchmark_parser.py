@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+benchmark_parser.py
+
+Measures HtmlParser throughput (pages/sec) on the raw_data/ corpus for
+each tree backend (html.parser, and lxml when installed) and process
+count. Pages are parsed from memory, so only parsing is timed; the
+corpus can be repeated to get a steadier number on small datasets.
+
+Usage:
+    python scripts/benchmark_parser.py --raw raw_data/my_company --repeat 10 --workers 1,2,4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.data_ingestion.parser import parse_html
+
+
+def _parse(item):
+    page_id, html, features = item
+    return parse_html(html, page_id, features=features)
+
+
+def available_backends() -> list[str]:
+    backends = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        backends.append("lxml")
+    except ImportError:
+        pass
+    return backends
+
+
+def run(pages: list[tuple[str, str]], features: str, workers: int) -> dict:
+    items = [(page_id, html, features) for page_id, html in pages]
+    t0 = time.perf_counter()
+    if workers <= 1:
+        results = [_parse(item) for item in items]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_parse, items, chunksize=max(1, len(items) // (4 * workers))))
+    wall = time.perf_counter() - t0
+    return {
+        "backend":      features,
+        "workers":      workers,
+        "pages":        len(results),
+        "seconds":      round(wall, 3),
+        "pages_per_sec": round(len(results) / wall, 2) if wall else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--raw", default=str(ROOT / "raw_data"), help="directory searched recursively for *.html")
+    ap.add_argument("--repeat", type=int, default=5, help="times the corpus is parsed per run")
+    ap.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma list of process counts")
+    ap.add_argument("--backends", help="comma list (default: every installed backend)")
+    ap.add_argument("--output", help="optional JSON path for the results")
+    args = ap.parse_args()
+
+    files = sorted(Path(args.raw).rglob("*.html"))
+    if not files:
+        sys.exit(f"❌ No *.html files under {args.raw}")
+    pages = [(f.stem, f.read_text(encoding="utf-8")) for f in files] * args.repeat
+    size  = sum(len(html) for _, html in pages[:len(files)])
+    print(f"📄 {len(files)} pages ({size / len(files) / 1024:.0f} KB avg) × {args.repeat} = {len(pages)} parses")
+
+    backends = args.backends.split(",") if args.backends else available_backends()
+    workers  = sorted({int(w) for w in args.workers.split(",") if w.strip()})
+    results  = []
+    for backend in backends:
+        for n in workers:
+            result = run(pages, backend, n)
+            results.append(result)
+            print(f"   {backend:<12} {n:>2} proc  {result['pages_per_sec']:>8} pages/s  ({result['seconds']}s)")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps({"corpus": len(files), "repeat": args.repeat,
+                                                 "results": results}, indent=2))
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+benchmark_rag.py
+
+Replays a query corpus through app.core.rag_pipeline.run_rag and the /chat
+router against the real vectorstores/<COMPANY> index, with OpenAI replaced
+by scripts/fake_openai_server.py (deterministic, configurable latency) and
+MongoDB booking calls stubbed in memory.
+
+Reports p50/p95/p99 latency per query category, throughput at a fixed
+concurrency and allocations per request (tracemalloc), and writes it all
+to a JSON file so runs on different commits can be compared. Before
+timing anything it checks that a few fixed queries still take the
+expected answer path (exit status 1 if not).
+
+Usage:
+    python scripts/benchmark_rag.py --requests 500 --concurrency 16 --latency-ms 150
+    python scripts/benchmark_rag.py --compare benchmarks/rag_<old>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from fake_openai_server import FakeOpenAIConfig, serve
+
+# ─── Query corpus ─────────────────────────────────────────────────────
+CORPUS = {
+    "direct": [
+        "What is included in the Skardu sightseeing excursion?",
+        "What is excluded from the romantic escapade to Gilgit Hunza?",
+        "Show me the itinerary of the family tour by air to Hunza valley",
+        "Tour highlights of the Gilgit Baltistan package",
+        "Give me an overview of the Skardu excursion",
+    ],
+    "n_day": [
+        "What is included in the 5 day tour?",
+        "5-day Hunza itinerary please",
+        "What does the 5 days trip exclude?",
+        "Highlights of the 5 day Hunza China border trip",
+    ],
+    "open": [
+        "Is the Khunjerab Pass open in winter?",
+        "What kind of hotels do you use in Hunza?",
+        "Can I bring my kids on the Skardu trip?",
+        "How cold does it get at night in Gilgit?",
+        "Do you arrange flights from Islamabad?",
+        "What should I pack for a trip to the northern areas?",
+    ],
+    "booking": [
+        "create booking name=Bench User, phone=0300-0000000, trip_name=5-days-tour-to-hunza, "
+        "preferred_date=2025-07-01, starting_city=Lahore",
+        "create booking name=Bench User",
+        "cancel booking 000000000000000000000000",
+        "cancel booking",
+    ],
+}
+
+# Answer paths the pipeline must keep taking: one content word names a
+# topic, it does not ask the question an FAQ entry answers
+EXPECTED_MODES = {
+    "hunza":                          "llm",
+    "hotels":                         "llm",
+    "skardu":                         "llm",
+    "Is there an airport in Skardu?": "extractive",
+}
+
+
+def load_corpus(path: str | None) -> dict:
+    if not path:
+        return CORPUS
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {k: list(v) for k, v in data.items()}
+
+
+def schedule(corpus: dict, n: int) -> list[tuple[str, str]]:
+    """
+    n (category, query) pairs, round-robin over categories so every
+    category is represented at any request count.
+    """
+    pools = [[(cat, q) for q in qs] for cat, qs in corpus.items() if qs]
+    out, i = [], 0
+    while len(out) < n:
+        pool = pools[i % len(pools)]
+        out.append(pool[(i // len(pools)) % len(pool)])
+        i += 1
+    return out
+
+
+# ─── Stats ────────────────────────────────────────────────────────────
+def percentile(sorted_vals: list[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def summarize(samples: list[float]) -> dict:
+    vals = sorted(samples)
+    return {
+        "count":   len(vals),
+        "mean_ms": round(statistics.fmean(vals) * 1000, 3) if vals else 0.0,
+        "p50_ms":  round(percentile(vals, 50) * 1000, 3),
+        "p95_ms":  round(percentile(vals, 95) * 1000, 3),
+        "p99_ms":  round(percentile(vals, 99) * 1000, 3),
+        "max_ms":  round(vals[-1] * 1000, 3) if vals else 0.0,
+    }
+
+
+def report(latencies: list[tuple[str, float]], errors: int, wall: float, concurrency: int) -> dict:
+    by_cat: dict[str, list[float]] = {}
+    for cat, dt in latencies:
+        by_cat.setdefault(cat, []).append(dt)
+    return {
+        "concurrency":    concurrency,
+        "requests":       len(latencies) + errors,
+        "errors":         errors,
+        "wall_s":         round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "overall":        summarize([dt for _, dt in latencies]),
+        "by_category":    {cat: summarize(v) for cat, v in sorted(by_cat.items())},
+    }
+
+
+# ─── Targets ──────────────────────────────────────────────────────────
+def stub_booking(chat_module):
+    """
+    Replace MongoDB-backed booking calls imported by the chat router with
+    in-memory ones.
+    """
+    bookings = {}
+
+    def create_booking(**fields):
+        booking_id = f"{len(bookings) + 1:024d}"
+        bookings[booking_id] = fields
+        return booking_id
+
+    def cancel_booking(booking_id):
+        return bookings.pop(booking_id, None) is not None
+
+    chat_module.create_booking  = create_booking
+    chat_module.cancel_booking  = cancel_booking
+    chat_module.booking_exists  = lambda booking_id: booking_id in bookings
+
+
+def make_run_rag_target():
+    from app.core.rag_pipeline import run_rag
+
+    def call(query: str):
+        if query.lower().startswith(("create booking", "cancel booking")):
+            return None   # booking commands never reach run_rag
+        return run_rag(query)
+    return call
+
+
+def make_chat_client():
+    import httpx
+    from fastapi import FastAPI
+    from app.api import chat as chat_module
+
+    stub_booking(chat_module)
+    api = FastAPI()
+    api.include_router(chat_module.router, prefix="/chat")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://bench")
+
+
+def bench_run_rag(requests: list[tuple[str, str]], concurrency: int) -> dict:
+    call = make_run_rag_target()
+    work = [(c, q) for c, q in requests if c != "booking"]
+
+    def one(item):
+        cat, query = item
+        t0 = time.perf_counter()
+        try:
+            call(query)
+        except Exception:
+            return cat, None
+        return cat, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, work))
+    wall = time.perf_counter() - t0
+    ok = [(c, dt) for c, dt in results if dt is not None]
+    return report(ok, len(results) - len(ok), wall, concurrency)
+
+
+async def _bench_chat(requests: list[tuple[str, str]], concurrency: int) -> dict:
+    client = make_chat_client()
+    sem    = asyncio.Semaphore(concurrency)
+
+    async def one(cat, query):
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await client.post("/chat/", json={"message": query})
+            dt = time.perf_counter() - t0
+            return cat, dt if resp.status_code == 200 else None
+
+    async with client:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(c, q) for c, q in requests))
+        wall = time.perf_counter() - t0
+    ok = [(c, dt) for c, dt in results if dt is not None]
+    return report(ok, len(results) - len(ok), wall, concurrency)
+
+
+def bench_chat(requests: list[tuple[str, str]], concurrency: int) -> dict:
+    return asyncio.run(_bench_chat(requests, concurrency))
+
+
+def allocations(corpus: dict, rounds: int) -> dict:
+    """
+    Sequential tracemalloc pass: peak and retained bytes per run_rag call,
+    averaged per category.
+    """
+    call = make_run_rag_target()
+    per_cat: dict[str, dict[str, list[int]]] = {}
+    tracemalloc.start()
+    try:
+        for _ in range(rounds):
+            for cat, queries in corpus.items():
+                if cat == "booking":
+                    continue
+                for query in queries:
+                    before = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    call(query)
+                    current, peak = tracemalloc.get_traced_memory()
+                    row = per_cat.setdefault(cat, {"peak": [], "retained": []})
+                    row["peak"].append(peak - before)
+                    row["retained"].append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        cat: {
+            "calls":             len(row["peak"]),
+            "mean_peak_kib":     round(statistics.fmean(row["peak"]) / 1024, 1),
+            "mean_retained_kib": round(statistics.fmean(row["retained"]) / 1024, 1),
+        }
+        for cat, row in sorted(per_cat.items())
+    }
+
+
+def check_modes(expected: dict) -> dict:
+    """
+    {query: (expected mode, actual mode)} for every query whose answer
+    took a different path than expected.
+    """
+    from app.core.rag_pipeline import run_rag
+    failures = {}
+    for query, mode in expected.items():
+        actual = run_rag(query).mode
+        if actual != mode:
+            failures[query] = (mode, actual)
+    return failures
+
+
+# ─── Helpers ──────────────────────────────────────────────────────────
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: str):
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"\n📊 vs {baseline_path} ({baseline.get('meta', {}).get('commit', '?')})")
+    for target, res in current["results"].items():
+        old = baseline.get("results", {}).get(target)
+        if not old:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            a, b = old["overall"][key], res["overall"][key]
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"   {target:8} {key}: {a:9.2f} → {b:9.2f}  ({change})")
+        a, b = old["throughput_rps"], res["throughput_rps"]
+        print(f"   {target:8} rps:    {a:9.2f} → {b:9.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--targets", default="run_rag,chat", help="comma list of run_rag, chat")
+    ap.add_argument("--requests", type=int, default=200, help="requests per target")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--queries", help="JSON file {category: [query, ...]} replacing the built-in corpus")
+    ap.add_argument("--latency-ms", type=float, default=100.0, help="fake OpenAI base latency")
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--slow-rate", type=float, default=0.0)
+    ap.add_argument("--slow-ms", type=float, default=0.0)
+    ap.add_argument("--cold", action="store_true", help="clear embedding/answer caches before each target")
+    ap.add_argument("--alloc-rounds", type=int, default=3, help="tracemalloc rounds over the corpus (0 = skip)")
+    ap.add_argument("--output", help="JSON path (default benchmarks/rag_<commit>_<time>.json)")
+    ap.add_argument("--compare", help="earlier result JSON to diff against")
+    args = ap.parse_args()
+
+    # Fake OpenAI must be configured before the app reads its settings
+    fake_cfg = FakeOpenAIConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                                args.slow_rate, args.slow_ms)
+    server = serve(port=0, config=fake_cfg, background=True)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"]  = "fake"
+    os.environ.setdefault("MONGO_URI", "mongodb://127.0.0.1:27017/benchmark")   # never contacted
+    os.chdir(ROOT)
+
+    from app.core import rag_pipeline
+
+    corpus   = load_corpus(args.queries)
+    requests = schedule(corpus, args.requests)
+    targets  = [t.strip() for t in args.targets.split(",") if t.strip()]
+
+    print("🔥 Warming up…")
+    tenant  = rag_pipeline.get_tenant()
+    timings = rag_pipeline.warmup(tenant)
+    count   = tenant.collection().count()
+    print(f"   {count} vectors in {tenant.db_path}, warmup {timings}")
+    if not count:
+        print("⚠️  The collection is empty; open questions will only exercise BM25 + the LLM.")
+
+    print("🧭 Checking answer paths…")
+    mode_failures = check_modes(EXPECTED_MODES)
+    for query, (want, got) in mode_failures.items():
+        print(f"   ❌ {query!r}: expected {want}, got {got}")
+    if not mode_failures:
+        print(f"   {len(EXPECTED_MODES)} queries took the expected path")
+
+    results = {}
+    for target in targets:
+        if args.cold:
+            rag_pipeline._embedding_cache.clear()
+            tenant.answer_cache.clear()
+        print(f"🚀 {target}: {len(requests)} requests @ concurrency {args.concurrency}")
+        if target == "run_rag":
+            results[target] = bench_run_rag(requests, args.concurrency)
+        elif target == "chat":
+            results[target] = bench_chat(requests, args.concurrency)
+        else:
+            raise SystemExit(f"Unknown target: {target}")
+        o = results[target]["overall"]
+        print(f"   p50 {o['p50_ms']} ms  p95 {o['p95_ms']} ms  p99 {o['p99_ms']} ms  "
+              f"{results[target]['throughput_rps']} req/s  errors {results[target]['errors']}")
+
+    alloc = {}
+    if args.alloc_rounds:
+        print(f"🧮 Allocations ({args.alloc_rounds} rounds, sequential)…")
+        alloc = allocations(corpus, args.alloc_rounds)
+        for cat, row in alloc.items():
+            print(f"   {cat:8} peak {row['mean_peak_kib']} KiB  retained {row['mean_retained_kib']} KiB")
+
+    commit = git_commit()
+    out = {
+        "meta": {
+            "commit":      commit,
+            "timestamp":   datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python":      platform.python_version(),
+            "company":     rag_pipeline.COMPANY,
+            "vectors":     count,
+            "backend":     rag_pipeline.RETRIEVAL_BACKEND,
+            "fake_openai": vars(args) | {"fake_requests": fake_cfg.requests},
+        },
+        "results":     results,
+        "allocations": alloc,
+        "mode_failures": {q: {"expected": w, "actual": g} for q, (w, g) in mode_failures.items()},
+        "caches": {
+            "embedding": rag_pipeline.embedding_cache_stats(),
+            "answer":    rag_pipeline.answer_cache_stats(),
+            "batcher":   rag_pipeline.embedding_batcher_stats(),
+        },
+    }
+    path = Path(args.output) if args.output else (
+        ROOT / "benchmarks" / f"rag_{commit}_{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(out, indent=2), encoding="utf-8")
+    print(f"✅ Results → {path}")
+
+    if args.compare:
+        compare(out, args.compare)
+    server.shutdown()
+    if mode_failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+fake_openai_server.py
+
+Deterministic local stand-in for the OpenAI embeddings and chat completion
+endpoints, with injectable latency and failures. Point the app at it with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake
+
+Usage:
+    python scripts/fake_openai_server.py --latency-ms 200 --slow-rate 0.05 --slow-ms 3000
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text: str, dim: int = 1536) -> list[float]:
+    """
+    Unit-length pseudo-random vector seeded by the text, so the same text
+    always maps to the same vector.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng  = random.Random(seed)
+    vec  = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+def fake_answer(messages: list[dict]) -> str:
+    question = messages[-1].get("content", "") if messages else ""
+    if "Question:" in question:
+        question = question.rsplit("Question:", 1)[1].split("\n", 1)[0].strip()
+    return f"(fake) This is a canned answer to: {question[:200]}"
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 slow_rate=0.0, slow_ms=0.0, dim=1536):
+        self.latency_ms = latency_ms
+        self.jitter_ms  = jitter_ms
+        self.error_rate = error_rate
+        self.slow_rate  = slow_rate
+        self.slow_ms    = slow_ms
+        self.dim        = dim
+        self.requests   = 0
+        self.lock       = threading.Lock()
+
+    def delay(self) -> float:
+        ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if self.slow_rate and random.random() < self.slow_rate:
+            ms += self.slow_ms
+        return ms / 1000.0
+
+
+def make_handler(config: FakeOpenAIConfig):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, like the real API
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            try:
+                self._handle()
+            except (BrokenPipeError, ConnectionResetError):
+                # client gave up (timeout or a cancelled hedge)
+                self.close_connection = True
+
+        def _handle(self):
+            with config.lock:
+                config.requests += 1
+            length = int(self.headers.get("Content-Length", 0))
+            body   = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(config.delay())
+
+            if config.error_rate and random.random() < config.error_rate:
+                if random.random() < 0.5:
+                    return self._json(429, {"error": {"message": "rate limited (fake)"}},
+                                      {"Retry-After": "0.05"})
+                return self._json(500, {"error": {"message": "server error (fake)"}})
+
+            if self.path.endswith("/embeddings"):
+                inputs = body.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                data = [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(t, config.dim)}
+                    for i, t in enumerate(inputs)
+                ]
+                tokens = sum(len(t.split()) for t in inputs)
+                return self._json(200, {
+                    "object": "list", "data": data, "model": body.get("model", ""),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+
+            if self.path.endswith("/chat/completions"):
+                answer  = fake_answer(body.get("messages", []))
+                created = int(time.time())
+                model   = body.get("model", "")
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for word in answer.split(" "):
+                        chunk = {
+                            "id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                            "created": created, "model": model,
+                            "choices": [{"index": 0, "delta": {"content": word + " "},
+                                         "finish_reason": None}],
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.close_connection = True
+                    return
+                prompt_tokens = sum(len(str(m.get("content", "")).split())
+                                    for m in body.get("messages", []))
+                completion_tokens = len(answer.split())
+                return self._json(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion",
+                    "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": answer}}],
+                    "usage": {"prompt_tokens": prompt_tokens,
+                              "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8900, config: FakeOpenAIConfig | None = None,
+          background: bool = False) -> ThreadingHTTPServer:
+    """
+    Start the fake server; with background=True it runs on a daemon thread
+    and the server object is returned (use port=0 for a free port).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config or FakeOpenAIConfig()))
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="base latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of 429/500 responses")
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests given --slow-ms extra")
+    ap.add_argument("--slow-ms", type=float, default=0.0)
+    ap.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    args = ap.parse_args()
+
+    config = FakeOpenAIConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                              args.slow_rate, args.slow_ms, args.dim)
+    print(f"🧪 Fake OpenAI listening on http://{args.host}:{args.port}/v1")
+    serve(args.host, args.port, config)
+
+
+if __name__ == "__main__":
+    main()
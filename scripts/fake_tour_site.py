@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+fake_tour_site.py
+
+Local stand-in for a tour operator's website, for exercising WebScraper
+without the network. Serves every *.html file of a directory at
+/<name> (and /<name>/), with ETag and Last-Modified headers and 304
+responses to conditional requests, plus injectable latency and failures.
+
+Usage:
+    python scripts/fake_tour_site.py --pages raw_data/my_company --latency-ms 100
+    # then scrape http://127.0.0.1:8901/<page-name>
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class FakeSiteConfig:
+    def __init__(self, pages_dir: Path, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0):
+        self.pages_dir  = Path(pages_dir)
+        self.latency_ms = latency_ms
+        self.jitter_ms  = jitter_ms
+        self.error_rate = error_rate
+        self.requests   = 0
+        self.not_modified = 0
+        self.lock       = threading.Lock()
+
+    def delay(self) -> float:
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000.0
+
+
+def make_handler(config: FakeSiteConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, so pooled connections are reused
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes = b"", headers: dict | None = None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            with config.lock:
+                config.requests += 1
+            time.sleep(config.delay())
+            if config.error_rate and random.random() < config.error_rate:
+                return self._send(503, b"unavailable", {"Retry-After": "0"})
+
+            name = self.path.split("?", 1)[0].strip("/").split("/")[-1] or "index"
+            page = config.pages_dir / f"{name}.html"
+            if not page.is_file():
+                return self._send(404, b"not found")
+
+            body  = page.read_bytes()
+            mtime = int(page.stat().st_mtime)
+            headers = {
+                "Content-Type":  "text/html; charset=utf-8",
+                "ETag":          '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+                "Last-Modified": formatdate(mtime, usegmt=True),
+            }
+            if self._not_modified(headers["ETag"], mtime):
+                with config.lock:
+                    config.not_modified += 1
+                return self._send(304, headers={"ETag": headers["ETag"]})
+            self._send(200, body, headers)
+
+        def _not_modified(self, etag: str, mtime: int) -> bool:
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                return etag in [t.strip() for t in if_none_match.split(",")]
+            since = self.headers.get("If-Modified-Since")
+            if since:
+                try:
+                    return mtime <= parsedate_to_datetime(since).timestamp()
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+    return Handler
+
+
+def serve(pages_dir: Path, host: str = "127.0.0.1", port: int = 8901,
+          config: FakeSiteConfig | None = None, background: bool = False) -> ThreadingHTTPServer:
+    """
+    Start the fake site; with background=True it runs on a daemon thread
+    and the server object is returned (use port=0 for a free port).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config or FakeSiteConfig(pages_dir)))
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", default="raw_data/my_company", help="directory of <name>.html files")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="base latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    args = ap.parse_args()
+
+    config = FakeSiteConfig(Path(args.pages), args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"🧪 Fake tour site serving {args.pages} on http://{args.host}:{args.port}/")
+    serve(config.pages_dir, args.host, args.port, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import json
+from pathlib import Path
+
+from app.core.direct_answers import TABLE_FILE, render_page
+from app.core.page_index import normalize_sections
+
+class AnswerRenderer:
+    """
+    Pre-render the direct answer for every (page_id, section) pair into
+    one lookup table, so the chat route only does a dictionary hit.
+    """
+
+    def __init__(self, processed_dir: Path):
+        self.processed_dir = processed_dir
+
+    def render_all(self) -> Path:
+        table = {}
+        for file in sorted(self.processed_dir.glob("*_structured.json")):
+            doc = json.loads(file.read_text(encoding="utf-8"))
+            page_id = doc.get("page_id") or file.stem.replace("_structured", "")
+            title   = doc.get("page_title", file.stem)
+            table[page_id] = render_page(title, normalize_sections(doc.get("sections", {})))
+
+        out = self.processed_dir / TABLE_FILE
+        out.write_text(json.dumps(table, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"✅ Rendered direct answers for {len(table)} pages → {out}")
+        return out
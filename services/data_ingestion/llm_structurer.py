@@ -1,20 +1,19 @@
-import os, re, json, logging
+import os, re, json, logging, hashlib, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
-import openai
 from bs4 import BeautifulSoup
 
+from app.core.llm_client import call_llm, client_stats, token_usage, transient_backoff
+
 # ─── Logging setup ─────────────────────────────────────────────────────
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)s %(message)s"
 )
 
-# ─── Load OpenAI key ───────────────────────────────────────────────────
+# ─── Load .env (OPENAI_API_KEY is checked on the first uncached call) ──
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY") or ""
-if not openai.api_key:
-    raise RuntimeError("Please set OPENAI_API_KEY in your .env")
 
 # ─── Prompt: strict JSON schema, arrays for days, objects for FAQs ─────
 SCHEMA_PROMPT = """
@@ -52,11 +51,43 @@ IMPORTANT:
 
 MAX_CHARS = 10_000  # truncate page text to avoid context‐length errors
 
+STRUCTURER_WORKERS  = int(os.getenv("STRUCTURER_WORKERS", "4"))       # pages in flight
+STRUCTURER_ATTEMPTS = int(os.getenv("STRUCTURER_ATTEMPTS", "4"))      # calls per page
+STRUCTURER_TIMEOUT  = float(os.getenv("STRUCTURER_TIMEOUT", "120"))   # seconds per call (1500 tokens out)
+
+# Key in each output recording what it was built from; a page whose HTML,
+# URL and prompt hash the same as last time is skipped
+SOURCE_HASH_KEY = "source_sha256"
+
+
+def source_hash(raw_html: str, url: str) -> str:
+    payload = json.dumps([raw_html, url, SCHEMA_PROMPT, MAX_CHARS], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_reply(raw: str) -> dict | None:
+    """
+    The JSON object in an LLM reply (code fences and trailing commas
+    tolerated), or None when there is none.
+    """
+    raw = re.sub(r"```(?:json)?", "", raw)
+    start = raw.find("{"); end = raw.rfind("}")+1
+    json_str = raw[start:end] if start>=0 and end>start else ""
+    json_str = re.sub(r",\s*([\]}])", r"\1", json_str)
+    try:
+        structured = json.loads(json_str)
+    except ValueError:
+        return None
+    return structured if isinstance(structured, dict) else None
+
+
 class LLMStructurer:
     def __init__(self, manifest_dir: Path, raw_dir: Path, processed_dir: Path):
         self.raw_dir       = raw_dir
         self.processed_dir = processed_dir
         self.processed_dir.mkdir(parents=True, exist_ok=True)
+        self.retries       = 0   # page-level retries (the client retries too)
+        self._lock         = threading.Lock()
 
         # page_id → provided URL map
         self.url_map = {}
@@ -67,125 +98,205 @@ class LLMStructurer:
             except:
                 pass
 
-    def structure_all(self):
-        for html_file in self.raw_dir.glob("*.html"):
-            page_id = html_file.stem
-            logging.info(f"Processing {page_id}")
-
-            # ── 1) Extract & truncate visible text ───────────────
-            raw_html = html_file.read_text(encoding="utf-8")
-            soup     = BeautifulSoup(raw_html, "html.parser")
-            full_txt = soup.get_text(separator="\n").strip()
-            text = full_txt[:MAX_CHARS]
-            if len(full_txt) > MAX_CHARS:
-                logging.warning(f"{page_id}: truncated to {MAX_CHARS} chars")
-
-            # ── 2) Pull out Day X sections from ALL headers ───────
-            day_sections = {}
-            for hdr in soup.find_all(
-                lambda t: t.name in [f"h{i}" for i in range(1,7)]
-                            and re.match(r"Day\s*\d+", t.get_text(strip=True))
-            ):
-                key = hdr.get_text(strip=True).replace(" ", "_")
-                steps = []
-                for sib in hdr.find_next_siblings():
-                    txt = sib.get_text(" ", strip=True)
-                    if not txt: continue
-                    if sib.name in [f"h{i}" for i in range(1,7)] and re.match(r"Day\s*\d+", txt):
-                        break
-                    steps.append(txt)
-                day_sections[key] = steps
-
-            url = self.url_map.get(page_id, "")
-
-            # ── 3) Build the prompt ──────────────────────────────
-            day_ctx = "\n\n".join(f"{k}:\n" + "\n".join(v) for k,v in day_sections.items())
-            prompt = (
-                f"{SCHEMA_PROMPT}\n\n"
-                f"URL: {url}\n\n"
-                f"RAW_DAY_SECTIONS:\n{day_ctx}\n\n"
-                f"PAGE_TEXT:\n{text}"
-            )
-
-            # ── 4) Call the API ──────────────────────────────────
+    def _previous_hash(self, out: Path) -> str | None:
+        try:
+            return json.loads(out.read_text(encoding="utf-8")).get(SOURCE_HASH_KEY)
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _call_with_backoff(self, page_id: str, messages: list[dict]) -> str:
+        """
+        call_llm with whole-call retries on rate limits, 5xx and timeouts
+        (the client's own retries share one deadline, which a 1500-token
+        completion can use up on its own).
+        """
+        attempt = 0
+        while True:
             try:
-                resp = openai.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role":"system","content":"You are an expert JSON extractor."},
-                        {"role":"user",  "content":prompt}
-                    ],
-                    temperature=0.0,
-                    max_tokens=1500
-                )
-                raw = resp.choices[0].message.content.strip()
+                # an unparsable (e.g. truncated) reply is never cached, so
+                # the next run asks again instead of replaying it
+                return call_llm(model="gpt-3.5-turbo", messages=messages, temperature=0.0,
+                                max_tokens=1500, timeout=STRUCTURER_TIMEOUT,
+                                cache_if=lambda reply: parse_reply(reply) is not None)
             except Exception as e:
-                logging.error(f"{page_id}: OpenAI API error: {e}")
-                raw = ""
+                pause = transient_backoff(e, attempt, base=2.0)
+                attempt += 1
+                if pause is None or attempt >= STRUCTURER_ATTEMPTS:
+                    raise
+                logging.warning(f"{page_id}: {type(e).__name__}, retry {attempt} in {pause:.1f}s")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(pause)
 
-            # ── 5) Clean & extract JSON block ───────────────────
-            raw = re.sub(r"```(?:json)?", "", raw)
-            start = raw.find("{"); end = raw.rfind("}")+1
-            json_str = raw[start:end] if start>=0 and end>start else ""
-            json_str = re.sub(r",\s*([\]}])", r"\1", json_str)
+    def structure_page(self, html_file: Path) -> str:
+        """
+        Structure one page. Returns "skipped" (HTML unchanged since the
+        last run), "structured", "stubbed" (the reply was not valid JSON)
+        or "failed" (the API kept failing; an earlier output is kept).
+        """
+        page_id = html_file.stem
+        out     = self.processed_dir / f"{page_id}_structured.json"
+        url     = self.url_map.get(page_id, "")
 
-            # ── 6) Try parse; on failure build a proper stub ─────
-            try:
-                structured = json.loads(json_str)
-            except Exception as e:
-                logging.warning(f"{page_id}: JSON parse failed ({e}); using stub")
-                # Prepare stub with real title, URL, days
-                can   = soup.find("link", rel="canonical")
-                og    = soup.find("meta", property="og:url")
-                real_url = (can and can.get("href")) or (og and og.get("content")) or url
-                title_t = soup.find("title") or soup.find("h1")
-                real_title = title_t.get_text(strip=True) if title_t else page_id.replace("-", " ").title()
-                travel_days = len(day_sections)
-                structured = {
-                    "page_title": real_title,
-                    "url": real_url or f"https://example.com/{page_id}",
-                    "sections": {
-                        "overview": "",
-                        "travel_days": travel_days,
-                        "pick_and_drop_point": "",
-                        "tour_highlights": [],
-                        "itinerary": day_sections,
-                        "places_to_visit": [],
-                        "trip_faqs": [],
-                        "what_is_included": [],
-                        "what_is_excluded": []
-                    }
+        raw_html = html_file.read_text(encoding="utf-8")
+        digest   = source_hash(raw_html, url)
+        if self._previous_hash(out) == digest:
+            return "skipped"
+        logging.info(f"Processing {page_id}")
+
+        # ── 1) Extract & truncate visible text ───────────────
+        soup     = BeautifulSoup(raw_html, "html.parser")
+        full_txt = soup.get_text(separator="\n").strip()
+        text = full_txt[:MAX_CHARS]
+        if len(full_txt) > MAX_CHARS:
+            logging.warning(f"{page_id}: truncated to {MAX_CHARS} chars")
+
+        # ── 2) Pull out Day X sections from ALL headers ───────
+        day_sections = {}
+        for hdr in soup.find_all(
+            lambda t: t.name in [f"h{i}" for i in range(1,7)]
+                        and re.match(r"Day\s*\d+", t.get_text(strip=True))
+        ):
+            key = hdr.get_text(strip=True).replace(" ", "_")
+            steps = []
+            for sib in hdr.find_next_siblings():
+                txt = sib.get_text(" ", strip=True)
+                if not txt: continue
+                if sib.name in [f"h{i}" for i in range(1,7)] and re.match(r"Day\s*\d+", txt):
+                    break
+                steps.append(txt)
+            day_sections[key] = steps
+
+        # ── 3) Build the prompt ──────────────────────────────
+        day_ctx = "\n\n".join(f"{k}:\n" + "\n".join(v) for k,v in day_sections.items())
+        prompt = (
+            f"{SCHEMA_PROMPT}\n\n"
+            f"URL: {url}\n\n"
+            f"RAW_DAY_SECTIONS:\n{day_ctx}\n\n"
+            f"PAGE_TEXT:\n{text}"
+        )
+
+        # ── 4) Call the API (cached completions are free) ────
+        failed = False
+        try:
+            raw = self._call_with_backoff(page_id, [
+                {"role":"system","content":"You are an expert JSON extractor."},
+                {"role":"user",  "content":prompt}
+            ])
+        except Exception as e:
+            logging.error(f"{page_id}: OpenAI API error: {e}")
+            if out.exists():
+                return "failed"   # keep the last good output; retried next run
+            raw, failed = "", True
+
+        # ── 5/6) Extract the JSON block; on failure build a proper stub ──
+        structured = parse_reply(raw)
+        stubbed    = structured is None
+        if stubbed:
+            if not failed:
+                logging.warning(f"{page_id}: JSON parse failed; using stub")
+            # Prepare stub with real title, URL, days
+            can   = soup.find("link", rel="canonical")
+            og    = soup.find("meta", property="og:url")
+            real_url = (can and can.get("href")) or (og and og.get("content")) or url
+            title_t = soup.find("title") or soup.find("h1")
+            real_title = title_t.get_text(strip=True) if title_t else page_id.replace("-", " ").title()
+            travel_days = len(day_sections)
+            structured = {
+                "page_title": real_title,
+                "url": real_url or f"https://example.com/{page_id}",
+                "sections": {
+                    "overview": "",
+                    "travel_days": travel_days,
+                    "pick_and_drop_point": "",
+                    "tour_highlights": [],
+                    "itinerary": day_sections,
+                    "places_to_visit": [],
+                    "trip_faqs": [],
+                    "what_is_included": [],
+                    "what_is_excluded": []
                 }
+            }
+
+        # ── 7) Normalize itinerary for all days ────────────
+        td = structured["sections"].get("travel_days", len(day_sections))
+        itn = structured["sections"].get("itinerary", {})
+        full_itn = {}
+        for i in range(1, td+1):
+            key = f"Day_{i}"
+            val = itn.get(key) or day_sections.get(key) or []
+            if isinstance(val, str):
+                val = [line.strip() for line in val.split("\n") if line.strip()]
+            full_itn[key] = val
+        structured["sections"]["itinerary"] = full_itn
 
-            # ── 7) Normalize itinerary for all days ────────────
-            td = structured["sections"].get("travel_days", len(day_sections))
-            itn = structured["sections"].get("itinerary", {})
-            full_itn = {}
-            for i in range(1, td+1):
-                key = f"Day_{i}"
-                val = itn.get(key) or day_sections.get(key) or []
-                if isinstance(val, str):
-                    val = [line.strip() for line in val.split("\n") if line.strip()]
-                full_itn[key] = val
-            structured["sections"]["itinerary"] = full_itn
-
-            # ── 8) Ensure FAQs are objects ─────────────────────
-            raw_faqs = structured["sections"].get("trip_faqs", [])
-            faqs = []
-            for e in raw_faqs:
-                if isinstance(e, dict) and "question" in e and "answer" in e:
-                    faqs.append(e)
-                elif isinstance(e, str):
-                    faqs.append({
-                        "question": e,
-                        "answer": "This information is not available in the provided text."
-                    })
-            structured["sections"]["trip_faqs"] = faqs
-
-            # ── 9) Save JSON ───────────────────────────────────
-            out = self.processed_dir / f"{page_id}_structured.json"
+        # ── 8) Ensure FAQs are objects ─────────────────────
+        raw_faqs = structured["sections"].get("trip_faqs", [])
+        faqs = []
+        for e in raw_faqs:
+            if isinstance(e, dict) and "question" in e and "answer" in e:
+                faqs.append(e)
+            elif isinstance(e, str):
+                faqs.append({
+                    "question": e,
+                    "answer": "This information is not available in the provided text."
+                })
+        structured["sections"]["trip_faqs"] = faqs
+
+        # ── 9) Save JSON (stubs keep no hash, so they are retried next run) ──
+        if not (failed or stubbed):
+            structured[SOURCE_HASH_KEY] = digest
+        try:
+            out.write_text(json.dumps(structured, ensure_ascii=False, indent=2), encoding="utf-8")
+            logging.info(f"{page_id}: structured JSON saved → {out}")
+        except Exception as e:
+            logging.error(f"{page_id}: failed to write file: {e}")
+            return "failed"
+        return "failed" if failed else "stubbed" if stubbed else "structured"
+
+    def structure_all(self, workers: int = STRUCTURER_WORKERS) -> dict:
+        """
+        Structure every raw HTML page with up to `workers` LLM calls in
+        flight. Returns (and logs) a summary: counts per outcome, failed
+        pages, pages/sec, client retries and tokens used.
+        """
+        files   = sorted(self.raw_dir.glob("*.html"))
+        started = time.perf_counter()
+        retries = client_stats().get("retries", 0) + self.retries
+        tokens  = sum(token_usage().values())
+        counts  = {"structured": 0, "skipped": 0, "stubbed": 0, "failed": 0}
+        failed  = []
+
+        def one(html_file):
             try:
-                out.write_text(json.dumps(structured, ensure_ascii=False, indent=2), encoding="utf-8")
-                logging.info(f"{page_id}: structured JSON saved → {out}")
+                return html_file.stem, self.structure_page(html_file)
             except Exception as e:
-                logging.error(f"{page_id}: failed to write file: {e}")
+                logging.error(f"{html_file.stem}: {e}")
+                return html_file.stem, "failed"
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="structure") as pool:
+            for page_id, status in pool.map(one, files):
+                counts[status] += 1
+                if status == "failed":
+                    failed.append(page_id)
+
+        elapsed = time.perf_counter() - started
+        worked  = len(files) - counts["skipped"]
+        summary = {
+            **counts,
+            "pages":         len(files),
+            "failed_pages":  failed,
+            "seconds":       round(elapsed, 2),
+            "pages_per_sec": round(worked / elapsed, 2) if worked and elapsed else 0.0,
+            "retries":       client_stats().get("retries", 0) + self.retries - retries,
+            "tokens":        sum(token_usage().values()) - tokens,
+        }
+        logging.info(
+            f"Structured {counts['structured']}, skipped {counts['skipped']} unchanged, "
+            f"stubbed {counts['stubbed']}, failed {counts['failed']} of {len(files)} pages "
+            f"in {summary['seconds']}s ({summary['pages_per_sec']} pages/s, "
+            f"{summary['retries']} retries, {summary['tokens']} tokens)"
+        )
+        for page_id in failed:
+            logging.warning(f"Failed: {page_id}")
+        return summary
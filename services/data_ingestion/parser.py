@@ -1,23 +1,218 @@
 # services/data_ingestion/parser.py
 
 import json
+import os
 import re
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, Tag
 
 logging.basicConfig(level=logging.INFO)
 
+# "auto" uses lxml when it is installed (several times faster to build the
+# tree), else the pure-Python html.parser
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto")
+PARSER_WORKERS      = int(os.getenv("PARSER_WORKERS", "0"))   # 0 → one per CPU
+
+_DAYS_RE    = re.compile(r"(\d+)\s+Days?")
+_PICKUP_RE  = re.compile(r"Pickup.*Drop", re.I)
+_DAY_HDR_RE = re.compile(r"Day\s*(\d+)", re.I)
+_HEADERS    = frozenset(("h1", "h2", "h3", "h4"))
+
+
+def resolve_backend(backend: str = HTML_PARSER_BACKEND) -> str:
+    """
+    BeautifulSoup feature string for `backend` ("auto", "lxml" or "html.parser").
+    """
+    if backend == "auto":
+        try:
+            import lxml  # noqa: F401
+            return "lxml"
+        except ImportError:
+            return "html.parser"
+    return backend
+
+
+def _texts(ul: Tag) -> list[str]:
+    return [li.get_text(strip=True) for li in ul.find_all("li")]
+
+
+def _scan(soup: BeautifulSoup) -> dict:
+    """
+    One depth-first pass in document order collecting every anchor the
+    rules below need (first h1/title/paragraphs, first matching strings,
+    lists, headers and FAQ blocks).
+    """
+    found = {
+        "h1": None, "title": None, "overview_p": None, "p": None,
+        "days": None, "pickup": None,
+        "highlight_uls": [], "uls": [], "headers": [], "faqs": [], "dls": [],
+    }
+    # (node, inside .overview, inside .highlights); children pushed reversed
+    stack = [(child, False, False) for child in reversed(soup.contents)]
+    while stack:
+        node, in_overview, in_highlights = stack.pop()
+        if isinstance(node, NavigableString):
+            if found["days"] is None and _DAYS_RE.search(node):
+                found["days"] = str(node)
+            if found["pickup"] is None and _PICKUP_RE.search(node):
+                found["pickup"] = str(node)
+            continue
+        if not isinstance(node, Tag):
+            continue
+
+        name = node.name
+        if name == "p":
+            if found["p"] is None:
+                found["p"] = node
+            if in_overview and found["overview_p"] is None:
+                found["overview_p"] = node
+        elif name == "ul":
+            found["uls"].append(node)
+            if in_highlights:
+                found["highlight_uls"].append(node)
+        elif name in _HEADERS:
+            found["headers"].append(node)
+            if name == "h1" and found["h1"] is None:
+                found["h1"] = node
+        elif name == "dl":
+            found["dls"].append(node)
+        elif name == "title" and found["title"] is None:
+            found["title"] = node
+
+        classes = node.get("class") or ()
+        if "faq" in classes:
+            found["faqs"].append(node)
+        child_overview   = in_overview or "overview" in classes
+        child_highlights = in_highlights or "highlights" in classes
+        stack.extend((child, child_overview, child_highlights) for child in reversed(node.contents))
+    return found
+
+
+def _list_after(hdr: Tag | None) -> list[str]:
+    if hdr is None:
+        return []
+    ul = hdr.find_next_sibling("ul")
+    return _texts(ul) if ul else []
+
+
+def parse_html(html: str, page_id: str, url: str = "", features: str = "html.parser") -> dict:
+    """
+    Extract one tour page into the client's JSON schema.
+    """
+    soup  = BeautifulSoup(html, features)
+    found = _scan(soup)
+
+    # 1) page_title
+    title_tag = found["h1"] or found["title"]
+    page_title = title_tag.get_text(strip=True) if title_tag else page_id
+
+    # 3) overview: first paragraph under main content
+    overview_tag = found["overview_p"] or found["p"]
+    overview = overview_tag.get_text(strip=True) if overview_tag else ""
+
+    # 4) travel_days: look for "x Day" or "x Days"
+    days = int(_DAYS_RE.search(found["days"]).group(1)) if found["days"] else 0
+
+    # 5) pick_and_drop_point: look for keywords
+    pd = found["pickup"].strip() if found["pickup"] else ""
+
+    # 6) tour_highlights: list items under some .highlights class or first UL
+    highlights = []
+    for ul in found["highlight_uls"] or found["uls"]:
+        highlights.extend(_texts(ul))
+        if highlights:
+            break
+
+    # 7) itinerary: map each Day header to its list of steps, and
+    # 8/10) the first h2/h3 about places / inclusions / exclusions
+    itinerary = {}
+    places_hdr = inc_hdr = exc_hdr = None
+    for hdr in found["headers"]:
+        txt = hdr.get_text(strip=True)
+        m = _DAY_HDR_RE.match(txt)
+        if m:
+            steps = []
+            # collect <li> under the next UL, or subsequent <p> until next header
+            next_ul = hdr.find_next_sibling("ul")
+            if next_ul:
+                steps = _texts(next_ul)
+            else:
+                for sib in hdr.find_next_siblings():
+                    if sib.name and re.match(r"h[1-4]", sib.name):
+                        break
+                    if sib.name == "p":
+                        steps.append(sib.get_text(strip=True))
+            itinerary[f"Day_{m.group(1)}"] = steps
+        if hdr.name in ("h2", "h3"):
+            lowered = txt.lower()
+            if places_hdr is None and "place" in lowered:
+                places_hdr = hdr
+            if inc_hdr is None and "include" in lowered:
+                inc_hdr = hdr
+            if exc_hdr is None and "exclude" in lowered:
+                exc_hdr = hdr
+
+    # 9) trip_faqs: FAQs under a .faq class or DL
+    faqs = []
+    for block in found["faqs"] or found["dls"]:
+        # dl terms
+        if block.name == "dl":
+            for q, a in zip(block.select("dt"), block.select("dd")):
+                faqs.append({
+                    "question": q.get_text(strip=True),
+                    "answer":   a.get_text(strip=True)
+                })
+        else:
+            q = block.select_one(".question") or block.select_one("dt")
+            a = block.select_one(".answer")   or block.select_one("dd")
+            if q and a:
+                faqs.append({
+                    "question": q.get_text(strip=True),
+                    "answer":   a.get_text(strip=True)
+                })
+
+    return {
+        "page_title": page_title,
+        "url": url,
+        "sections": {
+            "overview": overview,
+            "travel_days": days,
+            "pick_and_drop_point": pd,
+            "tour_highlights": highlights,
+            "itinerary": itinerary,
+            "places_to_visit": _list_after(places_hdr),
+            "trip_faqs": faqs,
+            "what_is_included": _list_after(inc_hdr),
+            "what_is_excluded": _list_after(exc_hdr),
+        }
+    }
+
+
+def _parse_file(html_file: Path, out: Path, url: str, features: str) -> str:
+    # process-pool entry point: everything crosses as paths and strings
+    structured = parse_html(html_file.read_text(encoding="utf-8"), html_file.stem, url, features)
+    out.write_text(json.dumps(structured, ensure_ascii=False, indent=2), encoding="utf-8")
+    return html_file.stem
+
+
 class HtmlParser:
     """
     Rule-based parser that extracts tour data from HTML
     into the client’s exact JSON schema.
+
+    Pages are parsed in a process pool (`workers`, default one per CPU),
+    each with a single traversal of its tree.
     """
 
-    def __init__(self, raw_dir: Path, processed_dir: Path, manifest_dir: Path):
+    def __init__(self, raw_dir: Path, processed_dir: Path, manifest_dir: Path,
+                 workers: int = PARSER_WORKERS, backend: str = HTML_PARSER_BACKEND):
         self.raw_dir       = raw_dir
         self.processed_dir = processed_dir
         self.manifest_dir  = manifest_dir
+        self.workers       = workers or os.cpu_count() or 1
+        self.features      = resolve_backend(backend)
 
         self.processed_dir.mkdir(parents=True, exist_ok=True)
 
@@ -28,123 +223,22 @@ class HtmlParser:
             if "url" in data:
                 self.url_map[f.stem] = data["url"]
 
-    def parse_all(self):
-        for html_file in self.raw_dir.glob("*.html"):
-            page_id = html_file.stem
-            logging.info(f"Parsing {page_id}")
-            html = html_file.read_text(encoding="utf-8")
-            soup = BeautifulSoup(html, "html.parser")
-
-            # 1) page_title
-            title_tag = soup.select_one("h1") or soup.find("title")
-            page_title = title_tag.get_text(strip=True) if title_tag else page_id
-
-            # 2) url
-            url = self.url_map.get(page_id, "")
-
-            # 3) overview: first paragraph under main content
-            overview_tag = soup.select_one(".overview p") or soup.select_one("p")
-            overview = overview_tag.get_text(strip=True) if overview_tag else ""
-
-            # 4) travel_days: look for "x Day" or "x Days"
-            days = 0
-            day_text = soup.find(text=re.compile(r"(\d+)\s+Days?"))
-            if day_text:
-                days = int(re.search(r"(\d+)\s+Days?", day_text).group(1))
-
-            # 5) pick_and_drop_point: look for keywords
-            pd = ""
-            pd_tag = soup.find(text=re.compile(r"Pickup.*Drop", re.I))
-            if pd_tag:
-                pd = pd_tag.strip()
-
-            # 6) tour_highlights: list items under some .highlights class or first UL
-            highlights = []
-            for ul in soup.select(".highlights ul") or soup.select("ul"):
-                for li in ul.select("li"):
-                    highlights.append(li.get_text(strip=True))
-                if highlights:
-                    break
-
-            # 7) itinerary: map each Day header to its list of steps
-            itinerary = {}
-            for hdr in soup.find_all(re.compile("^h[1-4]$")):
-                txt = hdr.get_text(strip=True)
-                m = re.match(r"Day\s*(\d+)", txt, re.I)
-                if m:
-                    key = f"Day_{m.group(1)}"
-                    steps = []
-                    # collect <li> under the next UL, or subsequent <p> until next header
-                    next_ul = hdr.find_next_sibling("ul")
-                    if next_ul:
-                        steps = [li.get_text(strip=True) for li in next_ul.select("li")]
-                    else:
-                        for sib in hdr.find_next_siblings():
-                            if sib.name and re.match(r"h[1-4]", sib.name):
-                                break
-                            if sib.name == "p":
-                                steps.append(sib.get_text(strip=True))
-                    itinerary[key] = steps
-
-            # 8) places_to_visit: find a section titled "places to visit"
-            places = []
-            sec = soup.find(lambda t: t.name in ["h2","h3"] and "place" in t.get_text(strip=True).lower())
-            if sec:
-                ul = sec.find_next_sibling("ul")
-                if ul:
-                    places = [li.get_text(strip=True) for li in ul.select("li")]
-
-            # 9) trip_faqs: FAQs under a .faq class or DL
-            faqs = []
-            for block in soup.select(".faq") or soup.select("dl"):
-                # dl terms
-                if block.name == "dl":
-                    terms = block.select("dt")
-                    defs  = block.select("dd")
-                    for q,a in zip(terms, defs):
-                        faqs.append({
-                            "question": q.get_text(strip=True),
-                            "answer":   a.get_text(strip=True)
-                        })
-                else:
-                    q = block.select_one(".question") or block.select_one("dt")
-                    a = block.select_one(".answer")   or block.select_one("dd")
-                    if q and a:
-                        faqs.append({
-                            "question": q.get_text(strip=True),
-                            "answer":   a.get_text(strip=True)
-                        })
-
-            # 10) includes / excludes
-            included = []
-            exc      = []
-            inc_hdr = soup.find(lambda t: t.name in ["h2","h3"] and "include" in t.get_text(strip=True).lower())
-            if inc_hdr:
-                ul = inc_hdr.find_next_sibling("ul")
-                included = [li.get_text(strip=True) for li in ul.select("li")] if ul else []
-            exc_hdr = soup.find(lambda t: t.name in ["h2","h3"] and "exclude" in t.get_text(strip=True).lower())
-            if exc_hdr:
-                ul = exc_hdr.find_next_sibling("ul")
-                exc = [li.get_text(strip=True) for li in ul.select("li")] if ul else []
-
-            # assemble
-            structured = {
-                "page_title": page_title,
-                "url": url,
-                "sections": {
-                    "overview": overview,
-                    "travel_days": days,
-                    "pick_and_drop_point": pd,
-                    "tour_highlights": highlights,
-                    "itinerary": itinerary,
-                    "places_to_visit": places,
-                    "trip_faqs": faqs,
-                    "what_is_included": included,
-                    "what_is_excluded": exc,
-                }
-            }
-
-            # write out
-            out = self.processed_dir / f"{page_id}_structured.json"
-            out.write_text(json.dumps(structured, ensure_ascii=False, indent=2), encoding="utf-8")
-            logging.info(f"{page_id}: parsed → {out}")
+    def parse_all(self) -> int:
+        """
+        Parse every raw HTML page; returns the number of pages written.
+        """
+        files = sorted(self.raw_dir.glob("*.html"))
+        jobs  = [
+            (f, self.processed_dir / f"{f.stem}_structured.json", self.url_map.get(f.stem, ""), self.features)
+            for f in files
+        ]
+        workers = min(self.workers, len(jobs))
+        if workers <= 1:
+            done = [_parse_file(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                done = list(pool.map(_parse_file, *zip(*jobs), chunksize=max(1, len(jobs) // (4 * workers))))
+        for page_id in done:
+            logging.info(f"{page_id}: parsed → {self.processed_dir / f'{page_id}_structured.json'}")
+        logging.info(f"Parsed {len(done)} pages with {self.features} on {max(workers, 1)} process(es)")
+        return len(done)
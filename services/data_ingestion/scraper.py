@@ -1,31 +1,200 @@
 # services/data_ingestion/scraper.py
 
-import requests
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+SCRAPER_WORKERS       = int(os.getenv("SCRAPER_WORKERS", "16"))
+SCRAPER_PER_HOST      = int(os.getenv("SCRAPER_PER_HOST", "4"))          # concurrent requests per host
+SCRAPER_HOST_INTERVAL = float(os.getenv("SCRAPER_HOST_INTERVAL", "0.1"))  # seconds between request starts per host
+SCRAPER_TIMEOUT       = float(os.getenv("SCRAPER_TIMEOUT", "10"))
+SCRAPER_RETRIES       = int(os.getenv("SCRAPER_RETRIES", "2"))
+
+# ETag / Last-Modified / content hash per page, next to the HTML files
+VALIDATORS_FILE = ".scrape_validators.json"
+
+
+class ScrapeReport(NamedTuple):
+    fetched: list        # URLs whose page was written (new or changed)
+    unchanged: list      # 304 Not Modified, or the same content as on disk
+    failed: dict         # url → error message
+
+
+class _HostLimiter:
+    """
+    At most `concurrency` requests in flight per host, and request starts
+    at least `interval` seconds apart.
+    """
+
+    def __init__(self, concurrency: int, interval: float):
+        self.concurrency = concurrency
+        self.interval    = interval
+        self._hosts: dict[str, tuple[threading.Semaphore, threading.Lock, list]] = {}
+        self._lock       = threading.Lock()
+
+    def _host(self, host: str):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.Semaphore(self.concurrency), threading.Lock(), [0.0])
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, host: str):
+        sem, pace, last = self._host(host)
+        with sem:
+            with pace:
+                wait = last[0] + self.interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                last[0] = time.monotonic()
+            yield
+
 
 class WebScraper:
     """
     Download raw HTML pages from a list of URLs.
+
+    Pages are fetched concurrently over one pooled session, with per-host
+    concurrency and pacing limits. Each page's ETag / Last-Modified is
+    remembered, so a rerun sends conditional requests and unchanged pages
+    (304, or an identical body) are not rewritten. A failing URL is
+    reported rather than aborting the run.
     """
 
-    def __init__(self, output_dir: Path):
+    def __init__(
+        self,
+        output_dir: Path,
+        max_workers: int = SCRAPER_WORKERS,
+        per_host: int = SCRAPER_PER_HOST,
+        host_interval: float = SCRAPER_HOST_INTERVAL,
+        timeout: float = SCRAPER_TIMEOUT,
+        retries: int = SCRAPER_RETRIES,
+    ):
         """
         output_dir: Path to folder where raw HTML files will be saved.
         """
-        self.output_dir = output_dir
+        self.output_dir  = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.timeout     = timeout
+        self._limiter    = _HostLimiter(per_host, host_interval)
+        self._session    = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            ),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._validators_path = self.output_dir / VALIDATORS_FILE
+        self._validators      = self._load_validators()
+        self._lock            = threading.Lock()
+
+    def _load_validators(self) -> dict:
+        try:
+            return json.loads(self._validators_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_validators(self):
+        tmp = self._validators_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._validators, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self._validators_path)
+
+    @staticmethod
+    def page_name(url: str) -> str:
+        # Turn URL path into a filename (last path segment or 'index')
+        return url.rstrip('/').split('/')[-1] or 'index'
+
+    def fetch(self, url: str) -> str:
+        """
+        Fetch one URL (conditionally, if it was fetched before) and save it.
+        Returns "fetched" or "unchanged"; raises on failure.
+        """
+        name      = self.page_name(url)
+        file_path = self.output_dir / f"{name}.html"
+        with self._lock:
+            known = dict(self._validators.get(name, {}))
+
+        headers = {}
+        if file_path.exists() and known.get("url") == url:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        with self._limiter.slot(urlsplit(url).netloc):
+            resp = self._session.get(url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304:
+            return "unchanged"
+        resp.raise_for_status()
+
+        text   = resp.text
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        entry  = {
+            "url":           url,
+            "etag":          resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "sha256":        digest,
+        }
+        if file_path.exists() and known.get("sha256") == digest:
+            changed = False
+        else:
+            changed = not file_path.exists() or file_path.read_text(encoding='utf-8') != text
+        if changed:
+            tmp = file_path.with_suffix(".html.tmp")
+            tmp.write_text(text, encoding='utf-8')
+            os.replace(tmp, file_path)
+        with self._lock:
+            self._validators[name] = entry
+        return "fetched" if changed else "unchanged"
 
-    def scrape(self, urls: list[str]):
+    def scrape(self, urls: list[str]) -> ScrapeReport:
         """
-        For each URL:
+        For each URL (concurrently):
         1. Derive a safe filename.
-        2. Fetch HTML via HTTP.
-        3. Save the response text to disk.
+        2. Fetch HTML via HTTP, conditionally when validators are known.
+        3. Save the response text to disk if it changed.
         """
-        for url in urls:
-            # Turn URL path into a filename (last path segment or 'index')
-            name = url.rstrip('/').split('/')[-1] or 'index'
-            resp = requests.get(url, timeout=10)
-            resp.raise_for_status()  # Stop if we get a bad HTTP status
-            file_path = self.output_dir / f"{name}.html"
-            file_path.write_text(resp.text, encoding='utf-8')
+        report = ScrapeReport([], [], {})
+
+        def one(url):
+            try:
+                return url, self.fetch(url), None
+            except Exception as e:
+                return url, "failed", f"{type(e).__name__}: {e}"
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scrape") as pool:
+            for url, status, error in pool.map(one, urls):
+                if status == "fetched":
+                    report.fetched.append(url)
+                elif status == "unchanged":
+                    report.unchanged.append(url)
+                else:
+                    logger.warning(f"{url}: {error}")
+                    report.failed[url] = error
+
+        with self._lock:
+            self._save_validators()
+        return report
@@ -2,29 +2,124 @@
 
 import os
 import json
+import hashlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import Iterator
 from dotenv import load_dotenv
-
-import openai
 from chromadb import PersistentClient
 
-# ─── Load API key & config ────────────────────────────────────────────────
+from app.core.context_packer import count_tokens
+from app.ingestion.embedder import META_DIM, check_collection, get_embedder
+from app.ingestion.numpy_index import NumpyIndex
+
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    raise RuntimeError("Please set OPENAI_API_KEY in your environment")
+BATCH_TOKENS = int(os.getenv("VECTORSTORE_BATCH_TOKENS", "50000"))  # per embeddings request
+BATCH_SIZE   = int(os.getenv("VECTORSTORE_BATCH_SIZE", "512"))      # inputs per request
+CONCURRENCY  = int(os.getenv("VECTORSTORE_CONCURRENCY", "4"))       # requests in flight
+ADD_BATCH    = int(os.getenv("VECTORSTORE_ADD_BATCH", "5000"))      # rows per collection.upsert
+
+# Stored in each chunk's Chroma metadata; the collection itself is the
+# id → content hash manifest, so it can never drift from what is indexed
+HASH_KEY = "content_hash"
 
-# ─── Helper to generate embeddings ─────────────────────────────────────────
-def get_embedding(text: str) -> list[float]:
+# chunk metadata copied into Chroma (section / chunk_index let the context
+# packer stitch neighbouring windows of a vector hit)
+META_KEYS = ("page_id", "section", "chunk_index")
+
+# ─── Chunk stream → token-aware embedding batches ─────────────────────────
+def iter_chunks(processed_dir: Path) -> Iterator[tuple[str, str, dict]]:
     """
-    Generate an embedding for `text` using OpenAI v1 Embedding API.
+    (id, text, metadata) of every chunk in every *_structured.json.
     """
-    resp = openai.Embedding.create(
-        model="text-embedding-ada-002",
-        input=text
-    )
-    # v1 response shape: { data: [ { embedding: [...] } ], ... }
-    return resp.data[0].embedding
+    for file in sorted(processed_dir.glob("*_structured.json")):
+        doc = json.loads(file.read_text(encoding="utf-8"))
+        # each file has a "chunks" list
+        for chunk in doc.get("chunks", []):
+            meta = {k: chunk["metadata"][k] for k in META_KEYS if chunk["metadata"].get(k) is not None}
+            meta[HASH_KEY] = content_hash(chunk["text"], meta)
+            yield chunk["id"], chunk["text"], meta
+
+
+def content_hash(text: str, metadata: dict) -> str:
+    payload = json.dumps([text, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(collection, page_size: int = ADD_BATCH) -> dict[str, str | None]:
+    """
+    {chunk id: content hash} of everything already in the collection
+    (None for chunks written before hashes were recorded).
+    """
+    manifest, offset = {}, 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for chunk_id, meta in zip(page["ids"], page["metadatas"]):
+            manifest[chunk_id] = (meta or {}).get(HASH_KEY)
+        if len(page["ids"]) < page_size:
+            return manifest
+        offset += page_size
+
+
+def plan_sync(chunks, manifest: dict) -> tuple[list, dict, list]:
+    """
+    Diff the chunks on disk against the manifest:
+    (chunks to embed, {"added", "updated", "unchanged"} counts, stale ids).
+    """
+    current = {}
+    for chunk in chunks:
+        current[chunk[0]] = chunk   # a repeated id keeps its last chunk
+    todo   = []
+    counts = {"added": 0, "updated": 0, "unchanged": 0}
+    for chunk_id, chunk in current.items():
+        if chunk_id not in manifest:
+            counts["added"] += 1
+        elif manifest[chunk_id] != chunk[2][HASH_KEY]:
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        todo.append(chunk)
+    stale = [chunk_id for chunk_id in manifest if chunk_id not in current]
+    return todo, counts, stale
+
+
+def batched(chunks, max_tokens: int = BATCH_TOKENS, max_items: int = BATCH_SIZE):
+    """
+    Group chunks into lists of at most `max_items` chunks and (roughly)
+    `max_tokens` tokens; a single oversized chunk gets a batch of its own.
+    """
+    batch, tokens = [], 0
+    for chunk in chunks:
+        n = count_tokens(chunk[1])
+        if batch and (len(batch) >= max_items or tokens + n > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(chunk)
+        tokens += n
+    if batch:
+        yield batch
+
+
+def embed_batches(embedder, batches, concurrency: int = CONCURRENCY):
+    """
+    Yield (batch, embeddings) with up to `concurrency` embedding requests
+    in flight; batches come back in completion order.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed") as pool:
+        pending = {}
+        for batch in batches:
+            if len(pending) >= concurrency:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield pending.pop(fut), fut.result()
+            fut = pool.submit(embedder.embed, [text for _, text, _ in batch])
+            pending[fut] = batch
+        for fut in list(pending):
+            yield pending.pop(fut), fut.result()
+
+
 
 # ─── Main vectorstore builder ─────────────────────────────────────────────
 def main():
@@ -35,9 +130,16 @@ def main():
         f"vectorstores/{company}/chroma.sqlite3"
     )
 
-    # open (or create) the Chroma collection
+    # EMBEDDING_BACKEND picks the provider (openai, local, hashing, ...)
+    embedder = get_embedder()
+    print(f"🔢 Embedding with {embedder.backend}/{embedder.model}")
+
+    # open (or create) the Chroma collection, recording how it is embedded
     client     = PersistentClient(path=db_path)
-    collection = client.get_or_create_collection(name="docs")
+    collection = client.get_or_create_collection(name="docs", metadata=embedder.metadata())
+    check_collection(collection, embedder)
+    if META_DIM not in (collection.metadata or {}):
+        collection.modify(metadata={**(collection.metadata or {}), **embedder.metadata()})
 
     # walk through all your chunked JSON files
     root           = Path(__file__).parent.parent.parent
@@ -46,19 +148,45 @@ def main():
     if not processed_dir.exists():
         raise FileNotFoundError(f"{processed_dir} does not exist")
 
-    for file in processed_dir.glob("*_structured.json"):
-        doc = json.loads(file.read_text(encoding="utf-8"))
-        # each file has a "chunks" list
-        for chunk in doc.get("chunks", []):
-            text = chunk["text"]
-            emb  = get_embedding(text)
-
-            # Add into Chroma
-            collection.add(
-                documents=[text],
-                embeddings=[emb],
-                metadatas=[{"page_id": chunk["metadata"]["page_id"]}],
-                ids=[chunk["id"]],
-            )
-
-    print(f"✅ Vectorstore built at {db_path}")
+    # Only new or changed chunks are embedded; ids no longer on disk are deleted
+    todo, counts, stale = plan_sync(iter_chunks(processed_dir), load_manifest(collection))
+    counts["deleted"] = len(stale)
+    started = time.perf_counter()
+
+    # Embed in concurrent token-aware batches; write to Chroma in large
+    # upserts (one SQLite transaction each) from this thread only
+    add_batch = min(ADD_BATCH, client.get_max_batch_size())
+    for i in range(0, len(stale), add_batch):
+        collection.delete(ids=stale[i:i + add_batch])
+
+    ids, docs, embs, metas = [], [], [], []
+    n_batches = 0
+
+    def flush():
+        if ids:
+            collection.upsert(ids=ids, documents=docs, embeddings=embs, metadatas=metas)
+            for buf in (ids, docs, embs, metas):
+                buf.clear()
+
+    for batch, vectors in embed_batches(embedder, batched(todo)):
+        for (chunk_id, text, meta), emb in zip(batch, vectors):
+            ids.append(chunk_id)
+            docs.append(text)
+            embs.append(emb)
+            metas.append(meta)
+        n_batches += 1
+        if len(ids) >= add_batch:
+            flush()
+    flush()
+
+    print(f"✅ Vectorstore synced at {db_path}: "
+          f"{counts['added']} added, {counts['updated']} updated, "
+          f"{counts['deleted']} deleted, {counts['unchanged']} unchanged "
+          f"({n_batches} embedding batches, {time.perf_counter() - started:.1f}s)")
+
+    # Refresh the memory-mapped export used by RETRIEVAL_BACKEND=numpy
+    index_dir = Path(os.getenv("NUMPY_INDEX_PATH", str(Path(db_path).parent / "numpy_index")))
+    if todo or stale or not NumpyIndex.exists(index_dir):
+        index = NumpyIndex.export(collection, index_dir)
+        print(f"✅ NumPy index exported ({len(index)} vectors) at {index_dir}")
+    return counts